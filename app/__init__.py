@@ -1,8 +1,11 @@
 import os
+import sqlite3
 
 from flask import Flask
 from flask_login import LoginManager
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 
 from config import config
 
@@ -10,6 +13,15 @@ db = SQLAlchemy()
 login_manager = LoginManager()
 
 
+@event.listens_for(Engine, "connect")
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    """SQLite no valida claves foráneas por defecto; activarlas igual que en PostgreSQL"""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+
 def create_app(config_name=None):
     app = Flask(__name__)
 
@@ -30,6 +42,35 @@ def create_app(config_name=None):
     login_manager.init_app(app)
     login_manager.login_view = "auth.login"  # type: ignore
 
+    # Tamaño de la caché de imágenes QR
+    from app.utils.qr_generator import image_cache
+
+    image_cache.maxsize = int(app.config.get("QR_IMAGE_CACHE_SIZE", 1024))
+
+    # Tamaño del buffer de asistencias recientes del escáner
+    from app.utils.recent_attendance import recent_attendance
+
+    recent_attendance.maxlen = int(app.config.get("RECENT_ATTENDANCE_BUFFER_SIZE", 0))
+    recent_attendance.ttl = float(app.config.get("RECENT_ATTENDANCE_BUFFER_TTL", 30))
+
+    # Caché de totales de los listados paginados
+    from app.utils.count_cache import count_cache
+
+    count_cache.maxsize = int(app.config.get("ATTENDANCE_COUNT_CACHE_SIZE", 256))
+    count_cache.ttl = float(app.config.get("ATTENDANCE_COUNT_CACHE_TTL", 30))
+
+    # Caché de identidades de la sesión (usuario y rol) para login_required/admin_required
+    from app.utils.identity import identity_cache
+
+    identity_cache.maxsize = int(app.config.get("IDENTITY_CACHE_SIZE", 1024))
+    identity_cache.ttl = float(app.config.get("IDENTITY_CACHE_TTL", 30))
+
+    # Contador de consultas SQL por petición (cabecera X-Query-Count)
+    if app.config.get("SQL_QUERY_COUNTER", False):
+        from app.utils.query_counter import init_query_counter
+
+        init_query_counter(app)
+
     # Configurar user loader para Flask-Login
     @login_manager.user_loader
     def load_user(user_id):
@@ -43,6 +84,11 @@ def create_app(config_name=None):
     for bp in blueprints:
         app.register_blueprint(bp)
 
+    # Comandos de mantenimiento (flask upgrade-indexes, ...)
+    from app.commands import register_commands
+
+    register_commands(app)
+
     # Context processor para funciones de utilidad
     @app.context_processor
     def utility_processor():
@@ -70,8 +116,35 @@ def initialize_database():
     from app.models.role import Role
     from app.models.user import User
 
+    from sqlalchemy import inspect
+
+    inspector = inspect(db.engine)
+    # El resumen diario se llena desde las asistencias existentes al crear su tabla
+    stats_missing = not inspector.has_table("attendance_daily_stats")
+
+    _initialize_partitions(inspector.has_table("attendances"))
+
     db.create_all()
 
+    if stats_missing:
+        from app.repositories.attendance_stats_repository import (
+            AttendanceStatsRepository,
+        )
+
+        days = AttendanceStatsRepository().backfill()
+        print(f"Resumen diario de asistencias creado ({days} días)")
+
+    # create_all no agrega índices nuevos a tablas existentes; crearlos en una tabla
+    # grande tarda, así que no se hace al iniciar sino con `flask upgrade-indexes`
+    from app.utils.schema import pending_indexes
+
+    pending = [index.name for index, _ in pending_indexes()]
+    if pending:
+        print(
+            f"Índices pendientes ({', '.join(pending)}): ejecutar "
+            "`flask --app run upgrade-indexes`"
+        )
+
     # Crear roles por defecto
     if not Role.query.filter_by(name="Admin").first():
         admin_role = Role(name="Admin")
@@ -84,3 +157,37 @@ def initialize_database():
     # Usuarios de demostración removidos: no se crea usuario admin por defecto
 
     # Usuarios de demostración removidos: no se crea usuario de ejemplo por defecto
+
+
+def _initialize_partitions(attendances_exists: bool) -> None:
+    """Particionado mensual de asistencias (ATTENDANCE_PARTITIONING, solo PostgreSQL)"""
+    from flask import current_app
+
+    from app import db
+    from app.utils import partitioning
+
+    if not current_app.config.get("ATTENDANCE_PARTITIONING", False):
+        return
+    if db.engine.dialect.name != "postgresql":
+        print("ATTENDANCE_PARTITIONING requiere PostgreSQL; se ignora")
+        return
+
+    months_ahead = int(current_app.config.get("ATTENDANCE_PARTITION_MONTHS_AHEAD", 3))
+    try:
+        if not attendances_exists:
+            # Las demás tablas primero: attendances referencia a users
+            others = [t for t in db.metadata.sorted_tables if t.name != "attendances"]
+            db.metadata.create_all(bind=db.engine, tables=others)
+            created = partitioning.create_partitioned_table(months_ahead=months_ahead)
+            print(f"Tabla attendances particionada creada ({len(created)} meses)")
+        elif partitioning.is_partitioned():
+            for name in partitioning.ensure_partitions(months_ahead=months_ahead):
+                print(f"Partición {name} creada")
+        else:
+            print(
+                "attendances no está particionada: ejecutar "
+                "`flask --app run partitions setup` para convertirla"
+            )
+    except Exception as e:
+        # Otro worker pudo estar creándolas; se reintenta al próximo inicio
+        print(f"No se pudieron crear las particiones: {e}")
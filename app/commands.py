@@ -0,0 +1,118 @@
+from datetime import date
+
+import click
+
+
+def register_commands(app) -> None:
+    """Comandos de mantenimiento disponibles con `flask <comando>`"""
+
+    @app.cli.command("upgrade-indexes")
+    def upgrade_indexes_command():
+        """Crear los índices de los modelos que falten en una base existente."""
+        from app.utils.schema import upgrade_indexes
+
+        done = upgrade_indexes()
+        for operation in done:
+            click.echo(operation)
+        click.echo("Índices al día" if not done else f"{len(done)} cambios aplicados")
+
+    @app.cli.command("explain-attendance-queries")
+    def explain_attendance_queries_command():
+        """Mostrar el plan de las consultas de asistencias; falla si alguna no usa índices."""
+        from app.utils.query_plans import explain_attendance_queries
+
+        try:
+            results = explain_attendance_queries()
+        except ValueError as e:
+            raise click.ClickException(str(e)) from e
+
+        full_scans = []
+        for name, lines, full_scan in results:
+            click.echo(f"{name}:{' (recorre la tabla)' if full_scan else ''}")
+            for line in lines:
+                click.echo(f"    {line}")
+            if full_scan:
+                full_scans.append(name)
+        if full_scans:
+            raise click.ClickException(
+                f"Consultas sin índice: {', '.join(full_scans)}. "
+                "Ejecutar `flask upgrade-indexes`"
+            )
+        click.echo("Todas las consultas usan índices")
+
+    @app.cli.command("backfill-attendance-stats")
+    @click.option("--start", default=None, help="Fecha inicial YYYY-MM-DD")
+    @click.option("--end", default=None, help="Fecha final YYYY-MM-DD")
+    def backfill_attendance_stats_command(start, end):
+        """Reconstruir el resumen diario attendance_daily_stats desde attendances."""
+        from app.services.attendance_service import AttendanceService
+
+        try:
+            start_date = date.fromisoformat(start) if start else None
+            end_date = date.fromisoformat(end) if end else None
+        except ValueError as e:
+            raise click.BadParameter("Las fechas deben tener formato YYYY-MM-DD") from e
+
+        days = AttendanceService().backfill_daily_stats(start_date, end_date)
+        click.echo(f"Resumen diario reconstruido: {days} días")
+
+    @app.cli.group("partitions")
+    def partitions_group():
+        """Particionado mensual y archivo de asistencias (PostgreSQL)."""
+
+    @partitions_group.command("setup")
+    def partitions_setup_command():
+        """Convertir la tabla attendances existente en particionada por mes."""
+        from app.utils.partitioning import convert_to_partitioned
+
+        try:
+            created = convert_to_partitioned(
+                months_ahead=app.config["ATTENDANCE_PARTITION_MONTHS_AHEAD"]
+            )
+        except ValueError as e:
+            raise click.ClickException(str(e)) from e
+        click.echo(f"attendances particionada: {len(created)} particiones mensuales")
+
+    @partitions_group.command("create")
+    @click.option(
+        "--months-ahead",
+        type=int,
+        default=None,
+        help="Meses por adelantado (por defecto ATTENDANCE_PARTITION_MONTHS_AHEAD)",
+    )
+    def partitions_create_command(months_ahead):
+        """Crear las particiones de los próximos meses que falten."""
+        from app.utils.partitioning import ensure_partitions
+
+        if months_ahead is None:
+            months_ahead = app.config["ATTENDANCE_PARTITION_MONTHS_AHEAD"]
+        try:
+            created = ensure_partitions(months_ahead=months_ahead)
+        except ValueError as e:
+            raise click.ClickException(str(e)) from e
+        for name in created:
+            click.echo(f"+ {name}")
+        click.echo("Particiones al día" if not created else f"{len(created)} creadas")
+
+    @partitions_group.command("archive")
+    @click.option(
+        "--live-months",
+        type=int,
+        default=None,
+        help="Meses que quedan en la base (por defecto ATTENDANCE_LIVE_MONTHS)",
+    )
+    def partitions_archive_command(live_months):
+        """Archivar en ATTENDANCE_ARCHIVE_DIR las particiones de meses antiguos."""
+        from app.utils.partitioning import archive_partitions
+
+        if live_months is None:
+            live_months = app.config["ATTENDANCE_LIVE_MONTHS"]
+        try:
+            archived = archive_partitions(
+                app.config["ATTENDANCE_ARCHIVE_DIR"], live_months
+            )
+        except ValueError as e:
+            raise click.ClickException(str(e)) from e
+        for name, count in archived:
+            click.echo(f"{name}: {count} asistencias archivadas")
+        click.echo(f"{len(archived)} meses archivados")
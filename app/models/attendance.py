@@ -11,9 +11,14 @@ class Attendance(BaseModel):
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     date = db.Column(db.Date, default=date.today)  # Para unicidad diaria
 
-    # Restricción única: un registro por usuario por día
+    # Restricción única: un registro por usuario por día (también indexa el historial por usuario)
+    # Índice (date, id) que cubre user_id y timestamp: rango de fechas, orden de los listados
+    # y exportaciones sin leer la tabla. Índice por timestamp para consultas por hora.
+    # En bases existentes los crea `upgrade_indexes` (app/utils/schema.py).
     __table_args__ = (
         db.UniqueConstraint("user_id", "date", name="unique_daily_attendance"),
+        db.Index("ix_attendances_date_id", "date", "id", "user_id", "timestamp"),
+        db.Index("ix_attendances_timestamp", "timestamp"),
     )
 
     def to_dict(self) -> dict:
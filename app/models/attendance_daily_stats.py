@@ -0,0 +1,32 @@
+from app import db
+from app.models.base import BaseModel
+
+
+class AttendanceDailyStats(BaseModel):
+    """
+    Resumen por día de la tabla `attendances`, mantenido en la misma transacción que cada
+    alta o baja de asistencia (ver AttendanceStatsRepository).
+    """
+
+    __tablename__ = "attendance_daily_stats"
+
+    date = db.Column(db.Date, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    first_timestamp = db.Column(db.DateTime, nullable=True)
+    last_timestamp = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self) -> dict:
+        """Representación serializable del modelo"""
+        return {
+            "date": self.date.isoformat() if self.date else None,
+            "count": self.count,
+            "first_timestamp": (
+                self.first_timestamp.isoformat() if self.first_timestamp else None
+            ),
+            "last_timestamp": (
+                self.last_timestamp.isoformat() if self.last_timestamp else None
+            ),
+        }
+
+    def __repr__(self) -> str:
+        return f"<AttendanceDailyStats date={self.date} count={self.count}>"
@@ -1,9 +1,33 @@
-from datetime import date
-from typing import Iterable, Optional
+from collections import deque
+from datetime import date, datetime, timedelta
+from itertools import islice
+from typing import Iterable, Iterator, Optional, Union
+
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, make_transient_to_detached
 
 from app import db
 from app.models.attendance import Attendance
 from app.models.user import User
+from app.repositories.attendance_stats_repository import AttendanceStatsRepository
+from app.repositories.upsert import upsert_insert
+from app.utils.attendance_archive import (
+    ArchivedAttendance,
+    AttendanceArchive,
+    get_attendance_archive,
+)
+from app.utils.count_cache import CountCache, count_cache
+
+
+class DuplicateAttendanceError(ValueError):
+    """Ya existe asistencia para el usuario en la fecha (restricción unique_daily_attendance)."""
+
+    def __init__(
+        self,
+        message: str = "Ya se registró asistencia para este usuario en la fecha indicada",
+    ) -> None:
+        super().__init__(message)
 
 
 class AttendanceRepository:
@@ -15,8 +39,21 @@ class AttendanceRepository:
     - Consultas específicas como historial del usuario y asistencia por fecha.
 
     Nota: la actualización de registros de asistencia no está permitida por reglas de negocio.
+    Cada alta o baja actualiza `attendance_daily_stats` en la misma transacción y
+    descarta los totales de `count_in_range` cacheados que la incluyen.
+    Las consultas por rango (`find_in_range`, `find_page`, `iter_in_range`,
+    `count_in_range`) incluyen los meses archivados (ATTENDANCE_ARCHIVE_DIR) cuando el
+    rango llega a ellos; esas filas se retornan como `ArchivedAttendance`, de solo lectura.
     """
 
+    def __init__(
+        self,
+        stats: Optional[AttendanceStatsRepository] = None,
+        counts: Optional[CountCache] = None,
+    ) -> None:
+        self._stats = stats if stats is not None else AttendanceStatsRepository()
+        self._counts = counts if counts is not None else count_cache
+
     def create(self, **data) -> Attendance:
         """
         Crea y persiste un nuevo registro de asistencia.
@@ -32,6 +69,12 @@ class AttendanceRepository:
         if not isinstance(user_id, int) or user_id <= 0:
             raise ValueError("user_id es obligatorio y debe ser un entero positivo")
 
+        if self._upsert_insert() is not None:
+            attendance = self.insert_if_absent(user_id, attendance_date)
+            if attendance is None:
+                raise DuplicateAttendanceError()
+            return attendance
+
         user = User.query.get(user_id)
         if not user:
             raise ValueError("Usuario no existe")
@@ -41,9 +84,7 @@ class AttendanceRepository:
         target_date = attendance_date or date.today()
         existing = Attendance.query.filter_by(user_id=user_id, date=target_date).first()
         if existing:
-            raise ValueError(
-                "Ya se registró asistencia para este usuario en la fecha indicada"
-            )
+            raise DuplicateAttendanceError()
 
         attendance = Attendance(user_id=user_id)
         # Si se pasa 'date', setear explícitamente
@@ -51,9 +92,144 @@ class AttendanceRepository:
             attendance.date = attendance_date
 
         db.session.add(attendance)
+        db.session.flush()
+        self._stats.increment(
+            attendance.date, 1, attendance.timestamp, attendance.timestamp
+        )
         db.session.commit()
+        self._counts.invalidate([user_id], attendance.date)
         return attendance
 
+    def insert_if_absent(
+        self, user_id: int, attendance_date: Optional[date] = None
+    ) -> Optional[Attendance]:
+        """
+        Inserta la asistencia en una sola sentencia INSERT ... ON CONFLICT DO NOTHING RETURNING.
+        La existencia del usuario la garantiza la FK y la unicidad diaria `unique_daily_attendance`.
+        Retorna la asistencia creada, o None si ya existía para ese usuario y fecha.
+        Solo disponible en PostgreSQL y SQLite >= 3.35 (ver `_upsert_insert`).
+        """
+        insert = self._upsert_insert()
+        if insert is None:
+            raise NotImplementedError("El motor de base de datos no soporta upsert")
+
+        values = {
+            "user_id": user_id,
+            "date": attendance_date or date.today(),
+            "timestamp": datetime.utcnow(),
+        }
+        stmt = (
+            insert(Attendance)
+            .values(**values)
+            .on_conflict_do_nothing(index_elements=["user_id", "date"])
+            .returning(Attendance.id)
+        )
+        try:
+            new_id = db.session.execute(stmt).scalar_one_or_none()
+            if new_id is not None:
+                now = values["timestamp"]
+                self._stats.increment(values["date"], 1, now, now)
+            db.session.commit()
+        except IntegrityError as e:
+            # Con el conflicto diario ignorado, solo queda la FK: el usuario no existe
+            db.session.rollback()
+            raise ValueError("Usuario no existe") from e
+
+        if new_id is None:
+            return None
+        self._counts.invalidate([user_id], values["date"])
+        return self._attach(new_id, values)
+
+    def create_many(
+        self,
+        user_ids: Iterable[int],
+        attendance_date: Optional[date] = None,
+        timestamps: Optional[dict[int, datetime]] = None,
+    ) -> list[Attendance]:
+        """
+        Registra asistencia para varios usuarios en una sola sentencia multi-fila.
+        Los usuarios que ya tienen asistencia en la fecha se omiten.
+        - timestamps: momento del registro por user_id (p. ej. el del escaneo en la
+          escritura diferida); los usuarios sin entrada usan la hora actual.
+        Retorna solo las asistencias creadas.
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        for user_id in user_ids:
+            if not isinstance(user_id, int) or user_id <= 0:
+                raise ValueError("user_id debe ser un entero positivo")
+        if not user_ids:
+            return []
+
+        target_date = attendance_date or date.today()
+        now = datetime.utcnow()
+        timestamps = timestamps or {}
+        rows = [
+            {
+                "user_id": user_id,
+                "date": target_date,
+                "timestamp": timestamps.get(user_id, now),
+            }
+            for user_id in user_ids
+        ]
+        rows_by_user = {r["user_id"]: r for r in rows}
+
+        insert = self._upsert_insert()
+        if insert is None:
+            existing = {
+                user_id
+                for (user_id,) in db.session.query(Attendance.user_id).filter(
+                    Attendance.date == target_date, Attendance.user_id.in_(user_ids)
+                )
+            }
+            attendances = [Attendance(**r) for r in rows if r["user_id"] not in existing]
+            db.session.add_all(attendances)
+            db.session.flush()
+            created = [(a.id, rows_by_user[a.user_id]) for a in attendances]
+            self._increment_stats(target_date, [values for _, values in created])
+            db.session.commit()
+            self._counts.invalidate([v["user_id"] for _, v in created], target_date)
+            # Reemplazar las instancias expiradas por el commit para no recargarlas una a una
+            for attendance in attendances:
+                db.session.expunge(attendance)
+            return [self._attach(new_id, values) for new_id, values in created]
+
+        stmt = (
+            insert(Attendance)
+            .values(rows)
+            .on_conflict_do_nothing(index_elements=["user_id", "date"])
+            .returning(Attendance.id, Attendance.user_id)
+        )
+        try:
+            created = db.session.execute(stmt).all()
+            self._increment_stats(
+                target_date, [rows_by_user[user_id] for _, user_id in created]
+            )
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            raise ValueError("Uno o más usuarios no existen") from e
+        if created:
+            self._counts.invalidate([user_id for _, user_id in created], target_date)
+
+        return [self._attach(new_id, rows_by_user[user_id]) for new_id, user_id in created]
+
+    def _increment_stats(self, day: date, created: list[dict]) -> None:
+        """Suma al resumen diario las filas creadas, con su primera y última marca."""
+        if created:
+            stamps = [values["timestamp"] for values in created]
+            self._stats.increment(day, len(created), min(stamps), max(stamps))
+
+    def _attach(self, entity_id: int, values: dict) -> Attendance:
+        """Adjunta a la sesión una asistencia recién insertada, sin un SELECT adicional."""
+        attendance = Attendance(id=entity_id, **values)
+        make_transient_to_detached(attendance)
+        db.session.add(attendance)
+        return attendance
+
+    def _upsert_insert(self):
+        """Función `insert` del dialecto actual con ON CONFLICT ... RETURNING, o None si no hay soporte."""
+        return upsert_insert()
+
     def save(self, entity: Attendance) -> Attendance:
         """
         Persiste la entidad (insert/update según corresponda) y retorna la entidad.
@@ -82,6 +258,268 @@ class AttendanceRepository:
             query = query.limit(limit)
         return query.all()
 
+    def find_in_range(
+        self,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        *,
+        user_id: Optional[int] = None,
+    ) -> list[Union[Attendance, ArchivedAttendance]]:
+        """
+        Retorna las asistencias con fecha entre `start` y `end` (inclusive; None = sin límite),
+        ordenadas por fecha descendente y luego por ID, filtradas y paginadas en SQL,
+        con su usuario cargado en la misma consulta.
+        - user_id: restringe al historial de un usuario.
+        """
+        if offset < 0 or (limit is not None and limit < 0):
+            raise ValueError("offset y limit deben ser enteros no negativos")
+        query = (
+            Attendance.query.options(joinedload(Attendance.user))
+            .filter(*self._range_filters(start, end, user_id))
+            .order_by(Attendance.date.desc(), Attendance.id.desc())
+        )
+        if offset:
+            query = query.offset(offset)
+        if limit is not None:
+            query = query.limit(limit)
+        rows = query.all()
+
+        archive = self._archive_for(start)
+        if archive is None or (limit is not None and len(rows) == limit):
+            return rows
+        # Las filas archivadas van después de todas las de la base
+        skip = 0
+        if offset:
+            live = self._count_live(start, end, user_id)
+            skip = max(0, offset - live)
+        stop = None if limit is None else skip + limit - len(rows)
+        archived = islice(archive.rows(start, end, user_id), skip, stop)
+        return rows + self._load_archived(archived)
+
+    def find_page(
+        self,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        limit: int = 20,
+        *,
+        after: Optional[tuple[date, int]] = None,
+        before: Optional[tuple[date, int]] = None,
+        user_id: Optional[int] = None,
+    ) -> tuple[list[Union[Attendance, ArchivedAttendance]], bool]:
+        """
+        Paginación por clave (keyset) sobre (date, id), en el orden de `find_in_range`
+        y con el usuario cargado en la misma consulta.
+        - after: (date, id) de la última fila vista; retorna las `limit` siguientes.
+        - before: (date, id) de la primera fila vista; retorna las `limit` anteriores.
+        Busca en el índice a partir de la clave en vez de saltar filas con OFFSET, así
+        cualquier página cuesta lo mismo que la primera.
+        Retorna (asistencias, hay_más) donde `hay_más` indica si quedan filas en la
+        dirección recorrida.
+        """
+        if not isinstance(limit, int) or limit <= 0:
+            raise ValueError("limit debe ser un entero positivo")
+        if after is not None and before is not None:
+            raise ValueError("after y before son excluyentes")
+
+        key = tuple_(Attendance.date, Attendance.id)
+        query = Attendance.query.options(joinedload(Attendance.user)).filter(
+            *self._range_filters(start, end, user_id)
+        )
+        if before is not None:
+            query = query.filter(key > tuple_(*before)).order_by(
+                Attendance.date.asc(), Attendance.id.asc()
+            )
+        else:
+            if after is not None:
+                query = query.filter(key < tuple_(*after))
+            query = query.order_by(Attendance.date.desc(), Attendance.id.desc())
+
+        archive = self._archive_for(start)
+        boundary = archive.boundary() if archive is not None else None
+        if before is not None and boundary is not None and before[0] < boundary:
+            # Hacia atrás desde una fila archivada: primero las archivadas más cercanas
+            rows = self._archived_before(
+                archive, start, end, user_id, before, limit + 1
+            )
+            if len(rows) <= limit:
+                rows += query.limit(limit + 1 - len(rows)).all()
+        elif after is not None and boundary is not None and after[0] < boundary:
+            # La página empieza dentro del archivo: la base no tiene filas más antiguas
+            rows = self._archived_after(archive, start, end, user_id, after, limit + 1)
+        else:
+            rows = query.limit(limit + 1).all()
+            if archive is not None and before is None and len(rows) <= limit:
+                rows += self._archived_after(
+                    archive, start, end, user_id, after, limit + 1 - len(rows)
+                )
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if before is not None:
+            rows.reverse()
+        return rows, has_more
+
+    def iter_in_range(
+        self,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        *,
+        user_id: Optional[int] = None,
+        batch_size: int = 1000,
+    ) -> Iterator[tuple[int, Optional[date], Optional[datetime]]]:
+        """
+        Recorre (user_id, date, timestamp) de las asistencias en el orden de `find_in_range`
+        sin construir objetos ORM ni cargar el resultado completo: las filas se leen de a
+        `batch_size` (`yield_per`; cursor del lado del servidor en PostgreSQL).
+        La sesión debe seguir abierta mientras se consume el iterador.
+        """
+        stmt = (
+            select(Attendance.user_id, Attendance.date, Attendance.timestamp)
+            .where(*self._range_filters(start, end, user_id))
+            .order_by(Attendance.date.desc(), Attendance.id.desc())
+            .execution_options(yield_per=batch_size)
+        )
+        for row in db.session.execute(stmt):
+            yield tuple(row)
+
+        archive = self._archive_for(start)
+        if archive is not None:
+            for _, row_user_id, row_date, stamp in archive.rows(start, end, user_id):
+                yield row_user_id, row_date, stamp
+
+    def count_in_range(
+        self,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        *,
+        user_id: Optional[int] = None,
+    ) -> int:
+        """
+        Cantidad de asistencias que retornaría `find_in_range` sin paginación (COUNT en SQL).
+        El total se guarda en la caché de conteos hasta que un alta o baja lo afecte o
+        venza su TTL, así las páginas siguientes del mismo rango no repiten el COUNT.
+        """
+        key = (user_id, start, end)
+        cached = self._counts.get(key)
+        if cached is not None:
+            return cached
+
+        generation = self._counts.generation
+        count = self._count_live(start, end, user_id)
+        archive = self._archive_for(start)
+        if archive is not None:
+            count += self._count_archived(archive, start, end, user_id)
+        self._counts.set(key, count, generation)
+        return count
+
+    def _count_live(
+        self, start: Optional[date], end: Optional[date], user_id: Optional[int]
+    ) -> int:
+        return (
+            db.session.query(func.count(Attendance.id))
+            .filter(*self._range_filters(start, end, user_id))
+            .scalar()
+        )
+
+    def _range_filters(
+        self, start: Optional[date], end: Optional[date], user_id: Optional[int]
+    ) -> list:
+        """Condiciones de rango sobre columnas indexadas: (date, id) y (user_id, date)."""
+        filters = []
+        if user_id is not None:
+            if not isinstance(user_id, int) or user_id <= 0:
+                raise ValueError("user_id debe ser un entero positivo")
+            filters.append(Attendance.user_id == user_id)
+        if start is not None:
+            filters.append(Attendance.date >= start)
+        if end is not None:
+            filters.append(Attendance.date <= end)
+        return filters
+
+    # ---- Meses archivados ----
+
+    def _archive_for(self, start: Optional[date]) -> Optional[AttendanceArchive]:
+        """Archivo de meses antiguos si el rango que empieza en `start` llega a él, o None."""
+        archive = get_attendance_archive()
+        if archive is None or not archive.reaches(start):
+            return None
+        return archive
+
+    def _count_archived(
+        self,
+        archive: AttendanceArchive,
+        start: Optional[date],
+        end: Optional[date],
+        user_id: Optional[int],
+    ) -> int:
+        """
+        Asistencias archivadas del rango. Sin filtro de usuario se suman del resumen
+        diario, que se conserva al archivar, sin abrir el archivo.
+        """
+        if user_id is not None:
+            return archive.count(start, end, user_id)
+        last_archived = archive.boundary() - timedelta(days=1)
+        if end is None or end > last_archived:
+            end = last_archived
+        return self._stats.sum_in_range(start, end)
+
+    def _archived_after(
+        self,
+        archive: AttendanceArchive,
+        start: Optional[date],
+        end: Optional[date],
+        user_id: Optional[int],
+        after: Optional[tuple[date, int]],
+        n: int,
+    ) -> list[ArchivedAttendance]:
+        """Las `n` filas archivadas siguientes a `after` en orden (date DESC, id DESC)."""
+        rows = archive.rows(start, end, user_id)
+        if after is not None:
+            rows = (r for r in rows if (r[2], r[0]) < after)
+        return self._load_archived(islice(rows, n))
+
+    def _archived_before(
+        self,
+        archive: AttendanceArchive,
+        start: Optional[date],
+        end: Optional[date],
+        user_id: Optional[int],
+        before: tuple[date, int],
+        n: int,
+    ) -> list[ArchivedAttendance]:
+        """Las `n` filas archivadas anteriores a `before`, la más cercana primero."""
+        closest = deque(maxlen=n)
+        for row in archive.rows(start, end, user_id):
+            if (row[2], row[0]) <= before:
+                break
+            closest.append(row)
+        return self._load_archived(reversed(closest))
+
+    def _load_archived(self, rows: Iterable[tuple]) -> list[ArchivedAttendance]:
+        """Construye las filas archivadas con su usuario, cargando los usuarios en una consulta."""
+        attendances = [ArchivedAttendance(*row) for row in rows]
+        user_ids = {a.user_id for a in attendances}
+        if user_ids:
+            users = {u.id: u for u in User.query.filter(User.id.in_(user_ids))}
+            for attendance in attendances:
+                attendance.user = users.get(attendance.user_id)
+        return attendances
+
+    def find_recent(self, limit: int = 10) -> list[Attendance]:
+        """
+        Retorna las `limit` asistencias más recientes con su usuario cargado en la misma consulta.
+        """
+        if not isinstance(limit, int) or limit <= 0:
+            raise ValueError("limit debe ser un entero positivo")
+        return (
+            Attendance.query.options(joinedload(Attendance.user))
+            .order_by(Attendance.date.desc(), Attendance.id.desc())
+            .limit(limit)
+            .all()
+        )
+
     def update(self, entity_id: int, **data) -> Attendance:
         """
         Actualización no permitida por reglas de negocio.
@@ -90,15 +528,21 @@ class AttendanceRepository:
             "Los registros de asistencia no pueden ser actualizados"
         )
 
-    def delete(self, entity_id: int) -> None:
+    def delete(self, entity_id: int) -> tuple[int, date]:
         """
         Elimina el registro de asistencia por ID. Lanza error si no existe.
+        Retorna (user_id, fecha) de la asistencia eliminada.
         """
         attendance = self.find_by_id(entity_id)
         if not attendance:
             raise ValueError("Registro de asistencia no encontrado")
+        user_id, day = attendance.user_id, attendance.date
         db.session.delete(attendance)
+        db.session.flush()
+        self._stats.recompute([day])
         db.session.commit()
+        self._counts.invalidate([user_id], day)
+        return user_id, day
 
     # ---- Consultas específicas del dominio ----
 
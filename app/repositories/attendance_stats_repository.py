@@ -0,0 +1,143 @@
+from datetime import date, datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import delete, func, select
+
+from app import db
+from app.models.attendance import Attendance
+from app.models.attendance_daily_stats import AttendanceDailyStats
+from app.repositories.upsert import upsert_insert
+
+
+class AttendanceStatsRepository:
+    """
+    Repositorio del resumen diario `attendance_daily_stats` (cantidad y primera/última
+    marca de tiempo por fecha).
+
+    `increment` y `recompute` no hacen commit: se ejecutan dentro de la transacción del
+    alta o baja de asistencia, así el resumen nunca queda desfasado de `attendances`.
+    """
+
+    def increment(
+        self, day: date, count: int, first: datetime, last: datetime
+    ) -> None:
+        """Suma `count` asistencias nuevas de `day` registradas entre `first` y `last`."""
+        if count <= 0:
+            return
+        stats = AttendanceDailyStats
+        insert = upsert_insert()
+        if insert is not None:
+            if db.engine.dialect.name == "postgresql":
+                least, greatest = func.least, func.greatest
+            else:
+                least, greatest = func.min, func.max  # min/max escalares de SQLite
+            stmt = insert(stats).values(
+                date=day, count=count, first_timestamp=first, last_timestamp=last
+            )
+            excluded = stmt.excluded
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["date"],
+                set_={
+                    "count": stats.count + excluded.count,
+                    "first_timestamp": least(
+                        func.coalesce(stats.first_timestamp, excluded.first_timestamp),
+                        excluded.first_timestamp,
+                    ),
+                    "last_timestamp": greatest(
+                        func.coalesce(stats.last_timestamp, excluded.last_timestamp),
+                        excluded.last_timestamp,
+                    ),
+                },
+            )
+            db.session.execute(stmt)
+            return
+
+        row = db.session.get(stats, day, with_for_update=True)
+        if row is None:
+            db.session.add(
+                stats(date=day, count=count, first_timestamp=first, last_timestamp=last)
+            )
+            return
+        row.count += count
+        row.first_timestamp = min(filter(None, (row.first_timestamp, first)))
+        row.last_timestamp = max(filter(None, (row.last_timestamp, last)))
+
+    def recompute(self, days: Iterable[date]) -> None:
+        """
+        Recalcula el resumen de los días dados desde `attendances` (tras una baja, la primera
+        o última marca de tiempo no se puede descontar). Usa el índice por fecha: O(filas del día).
+        """
+        for day in set(days):
+            count, first, last = db.session.execute(
+                select(
+                    func.count(Attendance.id),
+                    func.min(Attendance.timestamp),
+                    func.max(Attendance.timestamp),
+                ).where(Attendance.date == day)
+            ).one()
+            row = db.session.get(AttendanceDailyStats, day)
+            if not count:
+                if row is not None:
+                    db.session.delete(row)
+                continue
+            if row is None:
+                row = AttendanceDailyStats(date=day)
+                db.session.add(row)
+            row.count, row.first_timestamp, row.last_timestamp = count, first, last
+
+    def backfill(self, start: Optional[date] = None, end: Optional[date] = None) -> int:
+        """
+        Reconstruye el resumen del rango (inclusive; None = sin límite) con un único
+        INSERT ... SELECT agrupado por fecha. Retorna la cantidad de días resumidos.
+        """
+        stats = AttendanceDailyStats
+        stats_filters, source_filters = [], []
+        if start is not None:
+            stats_filters.append(stats.date >= start)
+            source_filters.append(Attendance.date >= start)
+        if end is not None:
+            stats_filters.append(stats.date <= end)
+            source_filters.append(Attendance.date <= end)
+
+        source = (
+            select(
+                Attendance.date,
+                func.count(Attendance.id),
+                func.min(Attendance.timestamp),
+                func.max(Attendance.timestamp),
+            )
+            .where(Attendance.date.is_not(None), *source_filters)
+            .group_by(Attendance.date)
+        )
+        db.session.execute(delete(stats).where(*stats_filters))
+        db.session.execute(
+            stats.__table__.insert().from_select(
+                ["date", "count", "first_timestamp", "last_timestamp"], source
+            )
+        )
+        db.session.commit()
+        return (
+            db.session.query(func.count(stats.date)).filter(*stats_filters).scalar()
+        )
+
+    def sum_in_range(
+        self, start: Optional[date] = None, end: Optional[date] = None
+    ) -> int:
+        """Total de asistencias entre `start` y `end` según el resumen (una fila por día)."""
+        query = db.session.query(func.coalesce(func.sum(AttendanceDailyStats.count), 0))
+        if start is not None:
+            query = query.filter(AttendanceDailyStats.date >= start)
+        if end is not None:
+            query = query.filter(AttendanceDailyStats.date <= end)
+        return int(query.scalar())
+
+    def find_in_range(
+        self, start: Optional[date] = None, end: Optional[date] = None
+    ) -> list[AttendanceDailyStats]:
+        """Resumen de los días con asistencias entre `start` y `end`, por fecha ascendente."""
+        query = AttendanceDailyStats.query
+        if start is not None:
+            query = query.filter(AttendanceDailyStats.date >= start)
+        if end is not None:
+            query = query.filter(AttendanceDailyStats.date <= end)
+        return query.order_by(AttendanceDailyStats.date.asc()).all()
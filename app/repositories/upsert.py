@@ -0,0 +1,15 @@
+import sqlite3
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+
+
+def upsert_insert():
+    """Función `insert` del dialecto actual con ON CONFLICT ... RETURNING, o None si no hay soporte."""
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert
+    if dialect == "sqlite" and sqlite3.sqlite_version_info >= (3, 35):
+        return sqlite.insert
+    return None
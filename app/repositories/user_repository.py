@@ -1,8 +1,11 @@
 from typing import Iterable, Optional
 
+from sqlalchemy.orm import joinedload
+
 from app import db
 from app.models.role import Role
 from app.models.user import User
+from app.utils.identity import IdentityCache, identity_cache
 
 
 class UserRepository:
@@ -12,8 +15,13 @@ class UserRepository:
     Responsable de:
     - Crear, persistir, leer, actualizar y eliminar usuarios.
     - Consultas específicas como buscar por username y contar admins.
+
+    `update` y `delete` invalidan la identidad cacheada del usuario (ver `IdentityCache`).
     """
 
+    def __init__(self, identities: Optional[IdentityCache] = None) -> None:
+        self._identities = identities if identities is not None else identity_cache
+
     def create(self, **data) -> User:
         """
         Crea un nuevo usuario en memoria (sin commit) y lo persiste.
@@ -65,13 +73,29 @@ class UserRepository:
         """
         return User.query.get(entity_id)
 
+    def find_with_role(self, entity_id: int) -> Optional[User]:
+        """
+        Retorna el usuario por ID con su rol cargado en la misma consulta, o None si no existe.
+        """
+        return db.session.get(User, entity_id, options=[joinedload(User.role)])
+
+    def find_by_ids(self, entity_ids: Iterable[int]) -> list[User]:
+        """
+        Retorna los usuarios existentes entre los IDs dados, en una sola consulta IN.
+        """
+        entity_ids = list(set(entity_ids))
+        if not entity_ids:
+            return []
+        return User.query.filter(User.id.in_(entity_ids)).all()
+
     def find_all(
         self, *, offset: int = 0, limit: Optional[int] = None
     ) -> Iterable[User]:
         """
-        Retorna todos los usuarios, con soporte de paginación.
+        Retorna todos los usuarios con su rol cargado en la misma consulta,
+        con soporte de paginación.
         """
-        query = User.query.order_by(User.id.asc())
+        query = User.query.options(joinedload(User.role)).order_by(User.id.asc())
         if offset:
             query = query.offset(offset)
         if limit is not None:
@@ -111,6 +135,7 @@ class UserRepository:
             user.role_id = role.id
 
         db.session.commit()
+        self._identities.invalidate(entity_id)
         return user
 
     def delete(self, entity_id: int) -> None:
@@ -123,6 +148,7 @@ class UserRepository:
 
         db.session.delete(user)
         db.session.commit()
+        self._identities.invalidate(entity_id)
 
     # ---- Métodos específicos del dominio ----
 
@@ -1,19 +1,33 @@
+import json
+import time
+from datetime import date, timedelta
+
 from flask import (
     Blueprint,
     Response,
     current_app,
     flash,
+    jsonify,
     redirect,
     render_template,
     request,
     session,
+    stream_with_context,
     url_for,
 )
 
+from app.repositories.attendance_repository import DuplicateAttendanceError
 from app.routes.auth import admin_required
 from app.services.attendance_service import AttendanceService
+from app.services.attendance_writer import WriteBehindFullError, get_attendance_writer
 from app.services.qr_service import QRService
 from app.services.user_service import UserService
+from app.utils.attendance_export import (
+    available_export_formats,
+    get_export_format,
+)
+from app.utils.event_broker import get_event_broker
+from app.utils.replay_cache import get_replay_cache
 
 bp = Blueprint("admin", __name__, url_prefix="/admin")
 
@@ -34,8 +48,17 @@ def get_qr_service():
 @admin_required
 def dashboard():
     users = user_service.get_all()
+    # Totales desde el resumen diario: no recorre la tabla de asistencias
+    today = date.today()
+    week = attendance_service.get_daily_totals(
+        today - timedelta(days=today.weekday()), today
+    )
     return render_template(
-        "admin/dashboard.html", users=users, title="Panel de Administración"
+        "admin/dashboard.html",
+        users=users,
+        title="Panel de Administración",
+        attendance_today=week[-1]["count"],
+        attendance_week=sum(day["count"] for day in week),
     )
 
 
@@ -43,63 +66,278 @@ def dashboard():
 @admin_required
 def scanner():
     # Mostrar últimos registros de asistencia
-    recent_attendance = AttendanceService().get_all()[:10]
+    recent_attendance = attendance_service.get_recent(10)
     return render_template(
         "admin/scanner.html",
         title="Registrar Asistencia",
         recent_attendance=recent_attendance,
+        live_feed=current_app.config.get("ATTENDANCE_LIVE_FEED", False),
     )
 
 
-@bp.route("/record_attendance", methods=["POST"])
-@admin_required
-def record_attendance():
-    qr_token = request.form["qr_token"]
+# Código HTTP de /api/scan según el resultado del escaneo
+SCAN_STATUS_CODES = {
+    "created": 201,
+    "duplicate": 200,
+    "invalid": 400,
+    "user_not_found": 404,
+    "busy": 503,
+    "error": 500,
+}
+
+
+def process_scan(qr_token):
+    """
+    Valida un token escaneado y registra la asistencia.
+    Retorna un dict con `status` (created, duplicate, invalid, user_not_found, busy, error),
+    `message` y `category` (categoría de flash), y `user_id`/`username` si se identificó al usuario.
+    """
     qr_service = get_qr_service()
+    replay_cache = get_replay_cache()
+    result = {"user_id": None, "username": None}
+
+    def done(status, message, category):
+        result.update(status=status, message=message, category=category)
+        return result
+
+    # Token ya aceptado antes: duplicado sin validar ni consultar la base de datos
+    if replay_cache.seen_token(qr_token):
+        return done("duplicate", str(DuplicateAttendanceError()), "warning")
 
     # Validar token con el servicio QR
     user_id = qr_service.validate_qr_data(qr_token)
 
     if not user_id:
-        flash(
+        return done(
+            "invalid",
             "Token QR inválido o expirado. Por favor, solicita un nuevo código.",
             "danger",
         )
-        return redirect(url_for("admin.scanner"))
+    result["user_id"] = user_id
+
+    today = date.today()
+    # 2 ventanas de expiración: vida máxima de un token válido
+    token_ttl = 2 * int(current_app.config.get("QR_EXPIRATION", 60))
+    if replay_cache.seen_attendance(user_id, today):
+        replay_cache.remember(qr_token, user_id, today, token_ttl)
+        return done("duplicate", str(DuplicateAttendanceError()), "warning")
 
     # Obtener usuario
     user = user_service.get(user_id)
     if not user:
-        flash("Usuario no encontrado", "danger")
-        return redirect(url_for("admin.scanner"))
+        return done("user_not_found", "Usuario no encontrado", "danger")
+    result["username"] = user.username
 
     try:
-        # Intentar registrar asistencia
-        attendance = attendance_service.create(user_id)
-        flash(f"✅ Asistencia registrada exitosamente para {user.username}!", "success")
+        writer = get_attendance_writer()
+        if writer is not None:
+            # Escritura diferida: confirmar ya, el hilo de fondo persiste en lote
+            scanned_at = writer.submit(user_id, today)
+            attendance_service.record_recent(
+                user_id, user.username, today, scanned_at
+            )
+        else:
+            # Intentar registrar asistencia (se publica en el feed en vivo)
+            attendance_service.create(user_id, user.username)
+        replay_cache.remember(qr_token, user_id, today, token_ttl)
+        return done(
+            "created",
+            f"✅ Asistencia registrada exitosamente para {user.username}!",
+            "success",
+        )
+    except WriteBehindFullError as e:
+        return done("busy", str(e), "danger")
+    except DuplicateAttendanceError as e:
+        replay_cache.remember(qr_token, user_id, today, token_ttl)
+        return done("duplicate", str(e), "warning")
     except ValueError as e:
-        flash(str(e), "warning")
+        return done("invalid", str(e), "warning")
     except Exception as e:
         current_app.logger.error(f"Error al registrar asistencia: {e}")
-        flash("Error al registrar asistencia. Intente nuevamente.", "danger")
+        return done(
+            "error", "Error al registrar asistencia. Intente nuevamente.", "danger"
+        )
 
+
+@bp.route("/record_attendance", methods=["POST"])
+@admin_required
+def record_attendance():
+    result = process_scan(request.form["qr_token"])
+    flash(result["message"], result["category"])
     return redirect(url_for("admin.scanner"))
 
 
+@bp.route("/api/scan", methods=["POST"])
+@admin_required
+def api_scan():
+    """
+    Registro de un escaneo en JSON, sin redirección ni recarga de la página del escáner.
+    Cuerpo JSON: {"token": "..."} (también acepta el campo de formulario `qr_token`).
+    Respuesta: resultado de `process_scan`; el código HTTP depende de `status`.
+    """
+    payload = request.get_json(silent=True) or {}
+    qr_token = payload.get("token") or request.form.get("qr_token")
+    if not isinstance(qr_token, str) or not qr_token.strip():
+        return (
+            jsonify(
+                {"status": "invalid", "message": "Token requerido", "category": "danger"}
+            ),
+            400,
+        )
+
+    result = process_scan(qr_token.strip())
+    return jsonify(result), SCAN_STATUS_CODES[result["status"]]
+
+
+@bp.route("/attendance/stream")
+@admin_required
+def attendance_stream():
+    """
+    Feed en vivo de asistencias registradas (Server-Sent Events).
+    Cada evento `attendance` trae en `data` un JSON con user_id, username, date y timestamp.
+    La conexión se cierra tras SSE_STREAM_TIMEOUT segundos y el navegador reconecta
+    con Last-Event-ID, así ningún cliente retiene un worker indefinidamente.
+    Solo está disponible con ATTENDANCE_LIVE_FEED activado.
+    """
+    if not current_app.config.get("ATTENDANCE_LIVE_FEED", False):
+        return Response("Feed en vivo desactivado", status=404, mimetype="text/plain")
+
+    broker = get_event_broker()
+    if not broker.acquire():
+        return Response(
+            "Demasiadas conexiones al feed en vivo",
+            status=503,
+            mimetype="text/plain",
+            headers={"Retry-After": "30"},
+        )
+
+    last_seq = broker.resume_from(
+        request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    )
+    stream_timeout = float(current_app.config.get("SSE_STREAM_TIMEOUT", 300))
+    heartbeat = float(current_app.config.get("SSE_HEARTBEAT_INTERVAL", 15))
+
+    # El generador no usa el contexto de la petición: la sesión de BD se libera al
+    # retornar la vista y cada cliente solo espera en la Condition del broker
+    def stream(after):
+        yield "retry: 3000\n\n"
+        deadline = time.monotonic() + stream_timeout
+        while (remaining := deadline - time.monotonic()) > 0:
+            events, after = broker.wait(after, min(heartbeat, remaining))
+            if not events:
+                yield ": ping\n\n"
+                continue
+            for seq, event in events:
+                yield (
+                    f"id: {broker.event_id(seq)}\nevent: attendance\n"
+                    f"data: {json.dumps(event)}\n\n"
+                )
+
+    response = Response(stream(last_seq), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # sin buffer en nginx
+    response.call_on_close(broker.release)
+    return response
+
+
+@bp.route("/attendance/batch", methods=["POST"])
+@admin_required
+def record_attendance_batch():
+    """
+    Registro masivo de asistencias para escáneres que acumulan lecturas (p. ej. sin conexión).
+    Cuerpo JSON: {"tokens": ["...", ...]}
+    Respuesta: {"results": [...], "summary": {...}}; cada resultado trae el token, su
+    `status` (created, duplicate, invalid, user_not_found), `message`, `user_id` y `username`.
+    """
+    payload = request.get_json(silent=True) or {}
+    tokens = payload.get("tokens")
+    max_size = int(current_app.config.get("ATTENDANCE_BATCH_MAX_SIZE", 500))
+
+    if not isinstance(tokens, list) or not all(isinstance(t, str) for t in tokens):
+        return jsonify({"error": "Se espera 'tokens': lista de strings"}), 400
+    if len(tokens) > max_size:
+        return jsonify({"error": f"Máximo {max_size} tokens por lote"}), 413
+
+    qr_service = get_qr_service()
+    replay_cache = get_replay_cache()
+    today = date.today()
+    token_ttl = 2 * int(current_app.config.get("QR_EXPIRATION", 60))
+    duplicate_message = str(DuplicateAttendanceError())
+
+    results = [{"token": t, "user_id": None, "username": None} for t in tokens]
+
+    def mark(result, status, message):
+        result["status"] = status
+        result["message"] = message
+
+    # 1. Validación en lote (firma y expiración) y atajos de la caché de duplicados
+    pending = []
+    for r in results:
+        if replay_cache.seen_token(r["token"]):
+            mark(r, "duplicate", duplicate_message)
+        else:
+            pending.append(r)
+    user_ids = qr_service.validate_qr_data_many([r["token"] for r in pending])
+
+    candidates = []
+    for r, user_id in zip(pending, user_ids):
+        r["user_id"] = user_id
+        if not user_id:
+            mark(r, "invalid", "Token QR inválido o expirado")
+        elif replay_cache.seen_attendance(user_id, today):
+            mark(r, "duplicate", duplicate_message)
+        else:
+            candidates.append(r)
+
+    # 2. Usuarios en una sola consulta IN
+    users = user_service.get_many([r["user_id"] for r in candidates])
+
+    # 3. Un insert multi-fila para las asistencias nuevas
+    to_create = []
+    for r in candidates:
+        user = users.get(r["user_id"])
+        if not user:
+            mark(r, "user_not_found", "Usuario no encontrado")
+            continue
+        r["username"] = user.username
+        to_create.append(r)
+
+    try:
+        created = attendance_service.create_many(
+            [r["user_id"] for r in to_create],
+            {r["user_id"]: r["username"] for r in to_create},
+        )
+    except Exception as e:
+        current_app.logger.error(f"Error al registrar asistencias en lote: {e}")
+        return jsonify({"error": "Error al registrar asistencias"}), 500
+
+    created_ids = {a.user_id for a in created}
+    for r in to_create:
+        if r["user_id"] in created_ids:
+            created_ids.discard(r["user_id"])  # tokens repetidos del mismo usuario
+            mark(r, "created", f"Asistencia registrada para {r['username']}")
+        else:
+            mark(r, "duplicate", duplicate_message)
+        replay_cache.remember(r["token"], r["user_id"], today, token_ttl)
+
+    summary = {}
+    for r in results:
+        summary[r["status"]] = summary.get(r["status"], 0) + 1
+    return jsonify({"results": results, "summary": summary})
+
+
 @bp.route("/attendance_list")
 @admin_required
 def attendance_list():
     """
-    Lista de asistencias con filtros por fecha, paginación y exportación CSV
+    Lista de asistencias con filtros por fecha, paginación y exportación
     Parámetros:
       - start: fecha inicio (YYYY-MM-DD o DD/MM/YYYY)
       - end: fecha fin (YYYY-MM-DD o DD/MM/YYYY)
-      - page: número de página (por defecto 1)
+      - cursor: cursor opaco de la página (enlaces Anterior/Siguiente); sin él, primera página
       - per_page: registros por página (por defecto 20, máx 100)
-      - export=csv: exporta el resultado filtrado a CSV
+      - export: exporta el resultado filtrado (csv, csv.gz, ndjson, parquet o arrow)
     """
-    import csv
-    import io
     from datetime import datetime as dt
 
     attendance_service = AttendanceService()
@@ -122,55 +360,44 @@ def attendance_list():
     end_date = parse_date(end_date_str)
 
     # Paginación
-    try:
-        page = max(1, int(request.args.get("page", "1")))
-    except ValueError:
-        page = 1
     try:
         per_page = max(1, min(100, int(request.args.get("per_page", "20"))))
     except ValueError:
         per_page = 20
-    offset = (page - 1) * per_page
-
-    # Obtener todos (ordenados desc por fecha en repo) y filtrar en memoria
-    all_attendance = attendance_service.get_all()
-
-    if start_date:
-        all_attendance = [a for a in all_attendance if a.date and a.date >= start_date]
-    if end_date:
-        all_attendance = [a for a in all_attendance if a.date and a.date <= end_date]
-
-    total_items = len(all_attendance)
-
-    # Exportación CSV
-    if request.args.get("export") == "csv":
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(["user_id", "date", "timestamp"])
-        for a in all_attendance:
-            writer.writerow(
-                [
-                    a.user_id,
-                    a.date.isoformat() if a.date else "",
-                    a.timestamp.isoformat() if a.timestamp else "",
-                ]
+
+    # Exportación (csv, csv.gz, ndjson, parquet, arrow)
+    export = request.args.get("export")
+    if export:
+        try:
+            export_format = get_export_format(export)
+        except ValueError as e:
+            flash(str(e), "danger")
+            return redirect(
+                url_for("admin.attendance_list", start=start_date_str, end=end_date_str)
             )
-        csv_data = output.getvalue()
+        # Streaming por lotes: memoria constante sin importar el tamaño del historial
+        rows = attendance_service.iter_export_rows(start_date, end_date)
+        filename = f"attendances.{export_format.extension}"
         return Response(
-            csv_data,
-            mimetype="text/csv",
-            headers={"Content-Disposition": "attachment; filename=attendances.csv"},
+            stream_with_context(export_format.stream(rows)),
+            mimetype=export_format.mimetype,
+            headers={"Content-Disposition": f"attachment; filename={filename}"},
         )
 
-    # Paginar
-    paginated = all_attendance[offset : offset + per_page]
+    # Página por cursor (keyset) y total filtrado, ambos en SQL
+    page_data = attendance_service.get_page(
+        start_date, end_date, per_page, request.args.get("cursor")
+    )
+    total_items = attendance_service.count_in_range(
+        start_date,
+        end_date,
+        approximate=current_app.config.get("ATTENDANCE_APPROXIMATE_COUNTS", False),
+    )
+    paginated = page_data.pop("items")
     pagination = {
-        "page": page,
-        "per_page": per_page,
+        **page_data,
         "total": total_items,
-        "pages": (total_items + per_page - 1) // per_page if per_page else 1,
-        "has_prev": page > 1,
-        "has_next": offset + per_page < total_items,
+        "pages": max(1, (total_items + per_page - 1) // per_page),
     }
 
     return render_template(
@@ -180,7 +407,9 @@ def attendance_list():
         pagination=pagination,
         start_date=start_date_str or "",
         end_date=end_date_str or "",
+        export_formats=available_export_formats(),
         total_items=total_items,
+        live_feed=current_app.config.get("ATTENDANCE_LIVE_FEED", False),
     )
 
 
@@ -1,8 +1,18 @@
 from functools import wraps
 
-from flask import Blueprint, flash, redirect, render_template, request, session, url_for
+from flask import (
+    Blueprint,
+    flash,
+    g,
+    redirect,
+    render_template,
+    request,
+    session,
+    url_for,
+)
 
 from app.services.user_service import UserService
+from app.utils.identity import Identity
 
 bp = Blueprint("auth", __name__, url_prefix="/auth")
 
@@ -16,6 +26,17 @@ def root():
     return redirect(url_for("auth.login"))
 
 
+def current_identity() -> Identity | None:
+    """
+    Usuario de la sesión (id, nombre y rol), resuelto una sola vez por petición y guardado
+    en `g`; entre peticiones lo sirve la caché de identidades (IDENTITY_CACHE_TTL).
+    """
+    if "identity" not in g:
+        user_id = session.get("user_id")
+        g.identity = user_service.get_identity(user_id) if user_id else None
+    return g.identity
+
+
 # Decoradores de autenticación
 def login_required(f):
     @wraps(f)
@@ -35,8 +56,8 @@ def admin_required(f):
             flash("Por favor, inicia sesión para acceder", "warning")
             return redirect(url_for("auth.login"))
 
-        user = user_service.get(session["user_id"])
-        if not user or user.role.name != "Admin":
+        identity = current_identity()
+        if not identity or not identity.is_admin:
             flash("Acceso denegado. Requiere permisos de administrador.", "danger")
             return redirect(url_for("user.dashboard"))
         return f(*args, **kwargs)
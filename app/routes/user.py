@@ -5,17 +5,23 @@ from flask import (
     Response,
     current_app,
     flash,
+    jsonify,
     redirect,
     render_template,
     request,
     session,
+    stream_with_context,
     url_for,
 )
 
-from app.routes.auth import login_required
+from app.routes.auth import current_identity, login_required
 from app.services.attendance_service import AttendanceService
 from app.services.qr_service import QRService
 from app.services.user_service import UserService
+from app.utils.attendance_export import (
+    available_export_formats,
+    get_export_format,
+)
 
 bp = Blueprint("user", __name__, url_prefix="/user")
 
@@ -32,44 +38,105 @@ def get_qr_service():
 @login_required
 def dashboard():
     """Dashboard del usuario con su código QR personal"""
-    user_service = UserService()
-    user = user_service.get(session.get("user_id"))
+    user = current_identity()
 
     if not user:
         flash("Usuario no encontrado", "danger")
         return redirect(url_for("auth.login"))
 
-    # Generar código QR para el usuario
+    # Generar token QR; la imagen se sirve aparte desde user.qr_image (cacheable por ventana)
     qr_service = get_qr_service()
-    qr_data = qr_service.create_qr_data(user.id)
+    qr_data = qr_service.create_qr_data(user.id, with_image=False)
 
-    # Cargar historial real de asistencias del usuario
+    # Últimas asistencias del usuario; el historial completo se pagina en user.attendance
     attendance_service = AttendanceService()
-    attendance_history = attendance_service.get_user_attendance(user.id)
+    history_page = attendance_service.get_page(per_page=10, user_id=user.id)
 
     return render_template(
         "user/dashboard.html",
         title="Mi Dashboard",
         user=user,
         qr_token=qr_data["token"],
-        qr_img=qr_data["image"],
+        qr_expires_at=qr_data["expires_at"],
+        qr_expires_in=qr_data["expires_in"],
+        qr_image_ext="svg" if qr_data["mimetype"] == "image/svg+xml" else "png",
+        qr_render_mode=current_app.config.get("QR_RENDER_MODE", "server"),
         QR_EXPIRATION=current_app.config.get("QR_EXPIRATION", 60),
-        attendance_history=attendance_history,
+        attendance_history=history_page["items"],
+        history_next_cursor=history_page["next_cursor"],
     )
 
 
+@bp.route("/qr")
+@login_required
+def qr():
+    """
+    Token QR vigente del usuario en JSON, usado por el dashboard para refrescar el código
+    sin recargar la página.
+    Parámetros:
+      - image=1: incluye la imagen en base64 y su tipo MIME
+    """
+    qr_service = get_qr_service()
+    with_image = request.args.get("image") == "1"
+    qr_data = qr_service.create_qr_data(session["user_id"], with_image=with_image)
+
+    payload = {
+        "token": qr_data["token"],
+        "expires_at": qr_data["expires_at"],
+        "expires_in": qr_data["expires_in"],
+    }
+    if with_image:
+        payload["image"] = qr_data["image"]
+        payload["mimetype"] = qr_data["mimetype"]
+
+    response = jsonify(payload)
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
+@bp.route("/qr.<any(png, svg):ext>")
+@login_required
+def qr_image(ext):
+    """
+    Imagen QR vigente del usuario en binario (PNG o SVG).
+    Con QR_TOKEN_WINDOWED (por defecto) el token, y con él la imagen, es el mismo para el
+    usuario durante toda la ventana: Cache-Control y ETag se alinean a la ventana, el
+    navegador reutiliza la imagen y las revalidaciones responden 304 sin renderizar.
+    Sin ventanas el token cambia cada segundo y la imagen no se cachea.
+    """
+    qr_service = get_qr_service()
+    qr_data = qr_service.create_qr_data(session["user_id"], with_image=False)
+
+    if not current_app.config.get("QR_TOKEN_WINDOWED", False):
+        image, mimetype = qr_service.render_qr_image(qr_data["token"], ext)
+        response = Response(image, mimetype=mimetype)
+        response.headers["Cache-Control"] = "no-store"
+        return response
+
+    etag = qr_service.image_etag(qr_data["token"], ext)
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        image, mimetype = qr_service.render_qr_image(qr_data["token"], ext)
+        response = Response(image, mimetype=mimetype)
+
+    # La URL es la misma para todos los usuarios: solo caché del navegador
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.max_age = qr_data["expires_in"]
+    return response
+
+
 @bp.route("/attendance")
 @login_required
 def attendance():
-    """Historial de asistencias del usuario con filtros, paginación y exportación CSV"""
-    import csv
-    import io
+    """Historial de asistencias del usuario con filtros, paginación y exportación"""
     from datetime import datetime as dt
 
-    user_service = UserService()
     attendance_service = AttendanceService()
 
-    user = user_service.get(session.get("user_id"))
+    user = current_identity()
 
     if not user:
         flash("Usuario no encontrado", "danger")
@@ -80,20 +147,11 @@ def attendance():
     end_date_str = request.args.get("end")
 
     # Paginación
-    try:
-        page = max(1, int(request.args.get("page", "1")))
-    except ValueError:
-        page = 1
     try:
         per_page = max(1, min(100, int(request.args.get("per_page", "20"))))
     except ValueError:
         per_page = 20
 
-    offset = (page - 1) * per_page
-
-    # Obtener historial completo y aplicar filtros en memoria si se especifican fechas
-    attendance_history = attendance_service.get_user_attendance(user.id)
-
     # Filtrar por rango de fechas si corresponde
     def parse_date(s: str):
         # Acepta formatos: YYYY-MM-DD o DD/MM/YYYY
@@ -107,50 +165,39 @@ def attendance():
     start_date = parse_date(start_date_str) if start_date_str else None
     end_date = parse_date(end_date_str) if end_date_str else None
 
-    if start_date:
-        attendance_history = [
-            a for a in attendance_history if a.date and a.date >= start_date
-        ]
-    if end_date:
-        attendance_history = [
-            a for a in attendance_history if a.date and a.date <= end_date
-        ]
-
-    total_items = len(attendance_history)
-
-    # Exportación CSV si se solicita
-    if request.args.get("export") == "csv":
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(["user_id", "date", "timestamp"])
-        for a in attendance_history:
-            writer.writerow(
-                [
-                    a.user_id,
-                    a.date.isoformat() if a.date else "",
-                    a.timestamp.isoformat() if a.timestamp else "",
-                ]
+    # Exportación (csv, csv.gz, ndjson, parquet, arrow)
+    export = request.args.get("export")
+    if export:
+        try:
+            export_format = get_export_format(export)
+        except ValueError as e:
+            flash(str(e), "danger")
+            return redirect(
+                url_for("user.attendance", start=start_date_str, end=end_date_str)
             )
-        csv_data = output.getvalue()
+        # Streaming por lotes: memoria constante sin importar el tamaño del historial
+        rows = attendance_service.iter_export_rows(
+            start_date, end_date, user_id=user.id
+        )
+        filename = f"attendance.{export_format.extension}"
         return Response(
-            csv_data,
-            mimetype="text/csv",
-            headers={
-                "Content-Disposition": "attachment; filename=attendance.csv",
-            },
+            stream_with_context(export_format.stream(rows)),
+            mimetype=export_format.mimetype,
+            headers={"Content-Disposition": f"attachment; filename={filename}"},
         )
 
-    # Aplicar paginación
-    paginated = attendance_history[offset : offset + per_page]
-
-    # Datos de paginación para el template
+    # Página por cursor (keyset) y total filtrado, ambos en SQL
+    page_data = attendance_service.get_page(
+        start_date, end_date, per_page, request.args.get("cursor"), user_id=user.id
+    )
+    total_items = attendance_service.count_in_range(
+        start_date, end_date, user_id=user.id
+    )
+    paginated = page_data.pop("items")
     pagination = {
-        "page": page,
-        "per_page": per_page,
+        **page_data,
         "total": total_items,
-        "pages": (total_items + per_page - 1) // per_page if per_page else 1,
-        "has_prev": page > 1,
-        "has_next": offset + per_page < total_items,
+        "pages": max(1, (total_items + per_page - 1) // per_page),
     }
 
     return render_template(
@@ -162,6 +209,7 @@ def attendance():
         pagination=pagination,
         start_date=start_date_str or "",
         end_date=end_date_str or "",
+        export_formats=available_export_formats(),
     )
 
 
@@ -169,8 +217,7 @@ def attendance():
 @login_required
 def profile():
     """Perfil del usuario"""
-    user_service = UserService()
-    user = user_service.get(session.get("user_id"))
+    user = current_identity()
 
     if not user:
         flash("Usuario no encontrado", "danger")
@@ -1,8 +1,17 @@
-from datetime import date
+from collections.abc import Iterator
+from datetime import date, datetime, timedelta
+
+from flask import current_app
 
 from app.models.attendance import Attendance
 from app.repositories.attendance_repository import AttendanceRepository
+from app.repositories.attendance_stats_repository import AttendanceStatsRepository
 from app.services.base_service import BaseService
+from app.utils.attendance_archive import get_attendance_archive
+from app.utils.cursor import PageCursor
+from app.utils.event_broker import get_event_broker
+from app.utils.recent_attendance import RecentAttendance, recent_attendance
+from app.utils.replay_cache import get_replay_cache
 
 
 class AttendanceService(BaseService):
@@ -11,12 +20,31 @@ class AttendanceService(BaseService):
     Mantiene la interfaz de alto nivel y reglas de negocio específicas.
     """
 
-    def __init__(self, repo: AttendanceRepository | None = None) -> None:
+    def __init__(
+        self,
+        repo: AttendanceRepository | None = None,
+        stats_repo: AttendanceStatsRepository | None = None,
+    ) -> None:
         self._repo = repo if repo is not None else AttendanceRepository()
+        self._stats = (
+            stats_repo if stats_repo is not None else AttendanceStatsRepository()
+        )
+
+    def create(self, user_id: int, username: str | None = None) -> Attendance:
+        """Crear un nuevo registro de asistencia y publicarlo en el feed en vivo"""
+        attendance = self._repo.create(user_id=user_id)
+        self.record_recent(user_id, username, attendance.date, attendance.timestamp)
+        return attendance
 
-    def create(self, user_id: int) -> Attendance:
-        """Crear un nuevo registro de asistencia"""
-        return self._repo.create(user_id=user_id)
+    def create_many(
+        self, user_ids: list[int], usernames: dict[int, str] | None = None
+    ) -> list[Attendance]:
+        """Registrar asistencia de varios usuarios; retorna y publica solo las creadas"""
+        created = self._repo.create_many(user_ids)
+        usernames = usernames or {}
+        for a in created:
+            self.record_recent(a.user_id, usernames.get(a.user_id), a.date, a.timestamp)
+        return created
 
     def get(self, attendance_id: int) -> Attendance | None:
         """Obtener un registro de asistencia por ID"""
@@ -26,6 +54,107 @@ class AttendanceService(BaseService):
         """Obtener todos los registros de asistencia"""
         return list(self._repo.find_all())
 
+    def get_in_range(
+        self,
+        start: date | None = None,
+        end: date | None = None,
+        offset: int = 0,
+        limit: int | None = None,
+        user_id: int | None = None,
+    ) -> list[Attendance]:
+        """Obtener asistencias entre dos fechas (inclusive), paginadas en la base de datos"""
+        return self._repo.find_in_range(start, end, offset, limit, user_id=user_id)
+
+    def iter_export_rows(
+        self,
+        start: date | None = None,
+        end: date | None = None,
+        user_id: int | None = None,
+    ) -> Iterator[tuple[int, date | None, datetime | None]]:
+        """Recorrer (user_id, date, timestamp) de las asistencias a exportar, por lotes"""
+        return self._repo.iter_in_range(start, end, user_id=user_id)
+
+    def get_page(
+        self,
+        start: date | None = None,
+        end: date | None = None,
+        per_page: int = 20,
+        cursor: str | None = None,
+        user_id: int | None = None,
+    ) -> dict:
+        """
+        Obtener una página de asistencias por cursor (keyset) en vez de OFFSET.
+        Retorna dict con: items, page, per_page, has_prev, has_next, prev_cursor, next_cursor.
+        Un cursor ausente o inválido retorna la primera página.
+        """
+        position = None
+        if cursor:
+            try:
+                position = PageCursor.decode(cursor)
+            except ValueError:
+                position = None
+
+        def first_page():
+            items, has_more = self._repo.find_page(
+                start, end, per_page, user_id=user_id
+            )
+            return items, 1, False, has_more
+
+        if position is None:
+            items, page, has_prev, has_next = first_page()
+        elif position.direction == "next":
+            key = (position.date, position.id)
+            items, has_next = self._repo.find_page(
+                start, end, per_page, after=key, user_id=user_id
+            )
+            page, has_prev = position.page, True
+        else:
+            key = (position.date, position.id)
+            items, has_prev = self._repo.find_page(
+                start, end, per_page, before=key, user_id=user_id
+            )
+            page, has_next = position.page, True
+            if not has_prev:
+                # Se llegó al inicio: completar la primera página si quedó corta
+                if len(items) < per_page:
+                    items, page, has_prev, has_next = first_page()
+                page = 1
+
+        prev_cursor = next_cursor = None
+        if items and has_prev:
+            first = items[0]
+            prev_page = max(1, page - 1)
+            prev_cursor = PageCursor("prev", first.date, first.id, prev_page).encode()
+        if items and has_next:
+            last = items[-1]
+            next_cursor = PageCursor("next", last.date, last.id, page + 1).encode()
+
+        return {
+            "items": items,
+            "page": page,
+            "per_page": per_page,
+            "has_prev": has_prev,
+            "has_next": has_next,
+            "prev_cursor": prev_cursor,
+            "next_cursor": next_cursor,
+        }
+
+    def count_in_range(
+        self,
+        start: date | None = None,
+        end: date | None = None,
+        user_id: int | None = None,
+        approximate: bool = False,
+    ) -> int:
+        """
+        Contar asistencias entre dos fechas (inclusive), con caché de conteos.
+        Con `approximate` y sin filtro de usuario suma el resumen diario en vez de contar
+        filas: O(días) en lugar de O(asistencias).
+        """
+        if approximate and user_id is None:
+            return self._stats.sum_in_range(start, end)
+        return self._repo.count_in_range(start, end, user_id=user_id)
+
     def update(self, attendance_id: int, **kwargs) -> None:
         """Actualizar un registro de asistencia existente"""
         # No se permite actualizar un registro de asistencia
@@ -34,8 +163,97 @@ class AttendanceService(BaseService):
         )
 
     def delete(self, attendance_id: int) -> None:
-        """Eliminar un registro de asistencia"""
-        self._repo.delete(attendance_id)
+        """Eliminar un registro de asistencia; el usuario puede volver a registrarse ese día"""
+        user_id, date_obj = self._repo.delete(attendance_id)
+        get_replay_cache().forget_attendance(user_id, date_obj)
+        recent_attendance.clear()
+
+    def get_daily_totals(self, start: date, end: date) -> list[dict]:
+        """
+        Asistencias por día entre `start` y `end` (inclusive), incluidos los días sin registros,
+        desde el resumen diario: O(días) en vez de O(asistencias).
+        Cada elemento: date, count, first_timestamp, last_timestamp.
+        """
+        if start > end:
+            raise ValueError("La fecha de inicio debe ser anterior a la fecha de fin")
+        by_date = {s.date: s for s in self._stats.find_in_range(start, end)}
+        totals = []
+        day = start
+        while day <= end:
+            stats = by_date.get(day)
+            totals.append(
+                {
+                    "date": day,
+                    "count": stats.count if stats else 0,
+                    "first_timestamp": stats.first_timestamp if stats else None,
+                    "last_timestamp": stats.last_timestamp if stats else None,
+                }
+            )
+            day += timedelta(days=1)
+        return totals
+
+    def get_weekly_totals(self, start: date, end: date) -> list[dict]:
+        """
+        Asistencias por semana (lunes a domingo) para las semanas que tocan el rango.
+        Cada elemento: week_start, count y days (días con asistencias).
+        """
+        week_start = start - timedelta(days=start.weekday())
+        week_end = end + timedelta(days=6 - end.weekday())
+        totals = []
+        for day in self.get_daily_totals(week_start, week_end):
+            if day["date"].weekday() == 0:
+                totals.append({"week_start": day["date"], "count": 0, "days": 0})
+            totals[-1]["count"] += day["count"]
+            totals[-1]["days"] += 1 if day["count"] else 0
+        return totals
+
+    def backfill_daily_stats(
+        self, start: date | None = None, end: date | None = None
+    ) -> int:
+        """
+        Reconstruir el resumen diario desde las asistencias; retorna los días resumidos.
+        Los meses archivados ya no están en la base: su resumen se conserva.
+        """
+        archive = get_attendance_archive()
+        boundary = archive.boundary() if archive is not None else None
+        if boundary is not None and (start is None or start < boundary):
+            start = boundary
+        return self._stats.backfill(start, end)
+
+    def get_recent(self, limit: int = 10) -> list[RecentAttendance]:
+        """Obtener las últimas asistencias, desde el buffer en memoria si está disponible"""
+        entries = recent_attendance.snapshot(limit)
+        if entries is None:
+            rows = self._repo.find_recent(max(limit, recent_attendance.maxlen))
+            entries = [RecentAttendance.from_model(a) for a in rows]
+            recent_attendance.warm(entries)
+        return entries[:limit]
+
+    def record_recent(
+        self,
+        user_id: int,
+        username: str | None,
+        date_obj: date | None = None,
+        timestamp: datetime | None = None,
+    ) -> None:
+        """Agregar una asistencia recién registrada al buffer de recientes y al feed en vivo"""
+        entry = RecentAttendance(
+            user_id=user_id,
+            username=username,
+            date=date_obj or date.today(),
+            timestamp=timestamp or datetime.utcnow(),
+        )
+        recent_attendance.push(entry)
+        if not current_app.config.get("ATTENDANCE_LIVE_FEED", False):
+            return
+        get_event_broker().publish(
+            {
+                "user_id": entry.user_id,
+                "username": entry.username,
+                "date": entry.date.isoformat(),
+                "timestamp": entry.timestamp.isoformat(),
+            }
+        )
 
     def get_for_user_on_date(self, user_id: int, date_obj: date) -> Attendance | None:
         """Obtener asistencia de un usuario en una fecha específica"""
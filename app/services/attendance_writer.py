@@ -0,0 +1,230 @@
+import atexit
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime
+
+from flask import current_app
+
+from app import db
+from app.repositories.attendance_repository import AttendanceRepository
+from app.repositories.user_repository import UserRepository
+from app.utils.replay_cache import get_replay_cache
+
+
+class WriteBehindFullError(RuntimeError):
+    """La cola de escritura diferida está llena (backpressure)."""
+
+    def __init__(
+        self, message: str = "Sistema ocupado registrando asistencias. Intente nuevamente."
+    ) -> None:
+        super().__init__(message)
+
+
+class AttendanceWriteBehind:
+    """
+    Escritura diferida de asistencias: los escaneos validados se encolan y un hilo en
+    segundo plano los persiste en lotes, fuera de la latencia de la petición.
+    - app: aplicación Flask; el hilo abre su propio app context.
+    - max_queue: capacidad de la cola; si está llena, `submit` espera `submit_timeout`
+      segundos y luego lanza WriteBehindFullError.
+    - batch_size / flush_interval: un lote se escribe al juntar `batch_size` asistencias
+      o pasados `flush_interval` segundos desde la primera pendiente.
+    Al terminar el proceso se vacía la cola (atexit). Las asistencias confirmadas que no
+    se pueden guardar (usuario eliminado, error persistente) se olvidan en la caché de
+    escaneos para que el usuario pueda volver a registrarse.
+    """
+
+    max_attempts = 3
+
+    def __init__(
+        self,
+        app,
+        max_queue: int = 10_000,
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+        submit_timeout: float = 0.5,
+    ) -> None:
+        self._app = app
+        self._queue: queue.Queue[tuple[int, date, datetime]] = queue.Queue(
+            maxsize=max_queue
+        )
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._submit_timeout = submit_timeout
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._idle = threading.Condition()
+        self._in_flight = 0
+        self._exit_hook = False
+
+    def submit(
+        self, user_id: int, date_obj: date, timestamp: datetime | None = None
+    ) -> datetime:
+        """
+        Encola una asistencia ya validada; retorna sin esperar a la base de datos.
+        La asistencia se guarda con `timestamp` (por defecto, ahora), no con la hora en
+        que se escribe el lote. Retorna ese timestamp.
+        """
+        timestamp = timestamp or datetime.utcnow()
+        self._ensure_started()
+        try:
+            self._queue.put(
+                (user_id, date_obj, timestamp), timeout=self._submit_timeout
+            )
+        except queue.Full as e:
+            raise WriteBehindFullError() from e
+        return timestamp
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Espera a que la cola se vacíe y el último lote se escriba. True si terminó a tiempo."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._idle:
+            while self._queue.qsize() or self._in_flight:
+                if self._thread is None or not self._thread.is_alive():
+                    # Sin hilo activo: escribir en el hilo actual
+                    batch = self._drain(self._queue.qsize())
+                    self._in_flight += 1
+                    try:
+                        self._write(batch)
+                    finally:
+                        self._in_flight -= 1
+                    continue
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Detiene el hilo escribiendo antes todo lo pendiente."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush(timeout)
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name="attendance-write-behind", daemon=True
+                )
+                self._thread.start()
+                if not self._exit_hook:
+                    atexit.register(self.stop)
+                    self._exit_hook = True
+
+    def _run(self) -> None:
+        while not self._stopping.is_set() or self._queue.qsize():
+            try:
+                first = self._queue.get(timeout=self._flush_interval)
+            except queue.Empty:
+                continue
+            with self._idle:
+                self._in_flight += 1
+            try:
+                batch = [first]
+                deadline = time.monotonic() + self._flush_interval
+                while len(batch) < self._batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+                self._write(batch)
+            finally:
+                with self._idle:
+                    self._in_flight -= 1
+                    self._idle.notify_all()
+
+    def _drain(self, limit: int) -> list[tuple[int, date, datetime]]:
+        batch = []
+        while len(batch) < max(limit, 1):
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: list[tuple[int, date, datetime]]) -> None:
+        by_date: dict[date, dict[int, datetime]] = defaultdict(dict)
+        for user_id, date_obj, timestamp in batch:
+            # Un escaneo repetido del mismo día conserva la hora del primero
+            by_date[date_obj].setdefault(user_id, timestamp)
+
+        with self._app.app_context():
+            repo = AttendanceRepository()
+            for date_obj, timestamps in by_date.items():
+                self._write_with_retry(repo, timestamps, date_obj)
+
+    def _write_with_retry(
+        self,
+        repo: AttendanceRepository,
+        timestamps: dict[int, datetime],
+        date_obj: date,
+    ) -> None:
+        user_ids = list(timestamps)
+        users = UserRepository()
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                # Un usuario eliminado después del escaneo haría fallar la FK de todo
+                # el lote en cada intento: se descarta solo su asistencia
+                existing = {user.id for user in users.find_by_ids(user_ids)}
+                missing = [u for u in user_ids if u not in existing]
+                if missing:
+                    self._app.logger.warning(
+                        f"Asistencias descartadas para {date_obj}: "
+                        f"usuarios inexistentes {missing}"
+                    )
+                    self._forget(missing, date_obj)
+                    user_ids = [u for u in user_ids if u in existing]
+                if user_ids:
+                    repo.create_many(user_ids, date_obj, timestamps)
+                return
+            except Exception as e:
+                db.session.rollback()
+                self._app.logger.warning(
+                    f"Error al escribir lote de asistencias (intento {attempt}): {e}"
+                )
+                time.sleep(0.1 * attempt)
+        self._app.logger.error(
+            f"Asistencias no persistidas para {date_obj}: user_ids={user_ids}"
+        )
+        self._forget(user_ids, date_obj)
+
+    def _forget(self, user_ids: list[int], date_obj: date) -> None:
+        """Permite volver a escanear a usuarios cuya asistencia confirmada no se guardó."""
+        replay_cache = get_replay_cache()
+        for user_id in user_ids:
+            replay_cache.forget_attendance(user_id, date_obj)
+
+
+def get_attendance_writer() -> AttendanceWriteBehind | None:
+    """Escritura diferida de la aplicación actual, o None si ATTENDANCE_WRITE_BEHIND está desactivado."""
+    if not current_app.config.get("ATTENDANCE_WRITE_BEHIND", False):
+        return None
+    writer = current_app.extensions.get("attendance_writer")
+    if writer is None:
+        config = current_app.config
+        writer = current_app.extensions.setdefault(
+            "attendance_writer",
+            AttendanceWriteBehind(
+                current_app._get_current_object(),
+                max_queue=int(config.get("ATTENDANCE_WRITE_BEHIND_QUEUE_SIZE", 10_000)),
+                batch_size=int(config.get("ATTENDANCE_WRITE_BEHIND_BATCH_SIZE", 200)),
+                flush_interval=float(
+                    config.get("ATTENDANCE_WRITE_BEHIND_FLUSH_INTERVAL", 1.0)
+                ),
+            ),
+        )
+    return writer
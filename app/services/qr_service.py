@@ -1,11 +1,16 @@
+import hashlib
 import time
 
 from flask import current_app
 
 from app.utils.qr_generator import (
+    IMAGE_MIMETYPES,
     generate_qr_image,
     generate_qr_token,
+    qr_token_expires_at,
+    render_qr_image,
     validate_qr_token,
+    validate_qr_tokens,
 )
 
 
@@ -13,12 +18,84 @@ class QRService:
     def __init__(self, secret_key):
         self.secret_key = secret_key
 
-    def create_qr_data(self, user_id):
-        """Genera el token para el QR del usuario."""
-        token = generate_qr_token(user_id, self.secret_key)
-        return {"token": token, "image": generate_qr_image(token)}
+    def create_qr_data(self, user_id, with_image=None):
+        """
+        Genera el token para el QR del usuario y, si se pide, su imagen en base64.
+        Por defecto la imagen solo se genera con QR_RENDER_MODE='server'; en modo 'client'
+        el navegador dibuja el QR a partir del token.
+        Incluye `expires_in`: segundos que faltan para que termine la ventana del token.
+        """
+        if with_image is None:
+            with_image = current_app.config.get("QR_RENDER_MODE", "server") != "client"
+        expiration = int(current_app.config.get("QR_EXPIRATION", 60))
+        windowed = current_app.config.get("QR_TOKEN_WINDOWED", False)
+        token = generate_qr_token(
+            user_id,
+            self.secret_key,
+            expiration=expiration,
+            windowed=windowed,
+            token_format=current_app.config.get("QR_TOKEN_FORMAT", "text"),
+        )
+        renderer = current_app.config.get("QR_RENDERER", "pil")
+        expires_at = qr_token_expires_at(token, expiration)
+        return {
+            "token": token,
+            "expires_at": int(expires_at),
+            "expires_in": max(1, int(expires_at - time.time())),
+            "image": (
+                generate_qr_image(
+                    token, expiration, renderer=renderer, windowed=windowed
+                )
+                if with_image
+                else None
+            ),
+            "mimetype": IMAGE_MIMETYPES[renderer],
+        }
+
+    def image_renderer(self, ext):
+        """
+        Renderizador para servir la imagen como `ext` ('png' o 'svg').
+        Para PNG se respeta QR_RENDERER salvo que esté configurado en 'svg'.
+        """
+        if ext == "svg":
+            return "svg"
+        renderer = current_app.config.get("QR_RENDERER", "pil")
+        return renderer if IMAGE_MIMETYPES[renderer] == "image/png" else "png"
+
+    def image_etag(self, token, ext):
+        """ETag de la imagen: en modo windowed el token es uno por usuario y ventana."""
+        return hashlib.sha256(f"{ext}:{token}".encode()).hexdigest()[:32]
+
+    def render_qr_image(self, token, ext):
+        """Bytes y tipo MIME de la imagen QR del token en el formato `ext`."""
+        renderer = self.image_renderer(ext)
+        expiration = int(current_app.config.get("QR_EXPIRATION", 60))
+        image = render_qr_image(
+            token,
+            expiration,
+            renderer=renderer,
+            windowed=current_app.config.get("QR_TOKEN_WINDOWED", False),
+        )
+        return image, IMAGE_MIMETYPES[renderer]
 
     def validate_qr_data(self, token):
         """Valida el token del QR escaneado."""
         tolerance = int(current_app.config.get("QR_EXPIRATION", 60))
-        return validate_qr_token(token, self.secret_key, tolerance=tolerance)
+        return validate_qr_token(
+            token,
+            self.secret_key,
+            tolerance=tolerance,
+            expiration=tolerance,
+            windowed=current_app.config.get("QR_TOKEN_WINDOWED", False),
+        )
+
+    def validate_qr_data_many(self, tokens):
+        """Valida un lote de tokens escaneados; retorna el user_id (o None) de cada uno."""
+        tolerance = int(current_app.config.get("QR_EXPIRATION", 60))
+        return validate_qr_tokens(
+            tokens,
+            self.secret_key,
+            tolerance=tolerance,
+            expiration=tolerance,
+            windowed=current_app.config.get("QR_TOKEN_WINDOWED", False),
+        )
@@ -1,6 +1,7 @@
 from app.models.user import User
 from app.repositories.user_repository import UserRepository
 from app.services.base_service import BaseService
+from app.utils.identity import Identity, identity_cache
 
 
 class UserService(BaseService):
@@ -22,6 +23,25 @@ class UserService(BaseService):
         """Obtener un usuario por ID"""
         return self._repo.find_by_id(user_id)
 
+    def get_identity(self, user_id: int) -> Identity | None:
+        """
+        Obtener id, nombre y rol del usuario; desde la caché de identidades si está vigente,
+        si no con una sola consulta (usuario y rol)
+        """
+        identity = identity_cache.get(user_id)
+        if identity is None:
+            generation = identity_cache.generation
+            user = self._repo.find_with_role(user_id)
+            if user is None:
+                return None
+            identity = Identity.from_model(user)
+            identity_cache.set(identity, generation)
+        return identity
+
+    def get_many(self, user_ids: list[int]) -> dict[int, User]:
+        """Obtener varios usuarios por ID, indexados por ID"""
+        return {user.id: user for user in self._repo.find_by_ids(user_ids)}
+
     def get_all(self) -> list[User]:
         """Obtener todos los usuarios"""
         return list(self._repo.find_all())
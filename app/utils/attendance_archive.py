@@ -0,0 +1,252 @@
+import csv
+import gzip
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+from flask import current_app
+
+# Columnas de los archivos de archivo; filas en orden (date DESC, id DESC)
+ARCHIVE_COLUMNS = ["id", "user_id", "date", "timestamp"]
+
+_FILENAME = re.compile(r"^attendances_(\d{4})(\d{2})\.csv\.gz$")
+
+ArchiveRow = tuple[int, int, date, datetime | None]
+
+
+@dataclass
+class ArchivedAttendance:
+    """Asistencia leída de un mes archivado (solo lectura, fuera de la sesión ORM)."""
+
+    id: int
+    user_id: int
+    date: date
+    timestamp: datetime | None
+    user: object | None = None
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "timestamp": self.timestamp.isoformat() if self.timestamp else None,
+            "date": self.date.isoformat() if self.date else None,
+        }
+
+
+@dataclass(frozen=True)
+class _MonthCounts:
+    """Totales de un mes archivado, por usuario y por día."""
+
+    by_user: dict[int, int]
+    by_day: dict[date, int]
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[ArchiveRow]) -> "_MonthCounts":
+        by_user, by_day = Counter(), Counter()
+        for _, user_id, date_obj, _ in rows:
+            by_user[user_id] += 1
+            by_day[date_obj] += 1
+        return cls(dict(by_user), dict(by_day))
+
+
+def archive_filename(month: date) -> str:
+    return f"attendances_{month:%Y%m}.csv.gz"
+
+
+def _next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def write_archive(path: str, rows: Iterable[ArchiveRow]) -> int:
+    """
+    Escribe un mes archivado (CSV con gzip) de forma atómica: primero a un temporal que
+    se renombra al final. `rows` debe venir en orden (date DESC, id DESC).
+    Retorna la cantidad de filas escritas.
+    """
+    tmp_path = path + ".tmp"
+    count = 0
+    with gzip.open(tmp_path, "wt", newline="", compresslevel=9) as f:
+        writer = csv.writer(f)
+        writer.writerow(ARCHIVE_COLUMNS)
+        for entity_id, user_id, date_obj, timestamp in rows:
+            writer.writerow(
+                [
+                    entity_id,
+                    user_id,
+                    date_obj.isoformat(),
+                    timestamp.isoformat() if timestamp else "",
+                ]
+            )
+            count += 1
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return count
+
+
+class AttendanceArchive:
+    """
+    Lectura de los meses archivados (`attendances_YYYYMM.csv.gz`) de un directorio.
+    Los meses archivados son siempre anteriores a las particiones vivas, así que en el
+    orden (date DESC, id DESC) sus filas van después de las de la base de datos.
+    - cache_months: meses descomprimidos que se mantienen en memoria.
+    La lista de meses se relee solo cuando cambia el directorio (su mtime) y los totales
+    de cada mes se calculan una vez al cargarlo, así contar no recorre las filas.
+    """
+
+    def __init__(self, directory: str, cache_months: int = 12) -> None:
+        self._directory = directory
+        self._cache_months = cache_months
+        self._cache: OrderedDict[tuple[str, float], list[ArchiveRow]] = OrderedDict()
+        self._months: tuple[int, list[date]] | None = None
+        self._counts: dict[str, tuple[float, _MonthCounts]] = {}
+        self._lock = threading.Lock()
+
+    def months(self) -> list[date]:
+        """Meses archivados, del más reciente al más antiguo."""
+        try:
+            mtime = os.stat(self._directory).st_mtime_ns
+        except FileNotFoundError:
+            return []
+        with self._lock:
+            if self._months is not None and self._months[0] == mtime:
+                return self._months[1]
+
+        months = []
+        for name in os.listdir(self._directory):
+            match = _FILENAME.match(name)
+            if match:
+                months.append(date(int(match.group(1)), int(match.group(2)), 1))
+        months.sort(reverse=True)
+        with self._lock:
+            self._months = (mtime, months)
+        return months
+
+    def boundary(self) -> date | None:
+        """Primer día posterior al último mes archivado, o None si no hay archivo."""
+        months = self.months()
+        return _next_month(months[0]) if months else None
+
+    def reaches(self, start: date | None) -> bool:
+        """True si un rango que empieza en `start` (None = sin límite) incluye meses archivados."""
+        boundary = self.boundary()
+        return boundary is not None and (start is None or start < boundary)
+
+    def rows(
+        self,
+        start: date | None = None,
+        end: date | None = None,
+        user_id: int | None = None,
+    ) -> Iterator[ArchiveRow]:
+        """Filas archivadas del rango (inclusive), en orden (date DESC, id DESC)."""
+        for month in self._months_in(start, end):
+            for row in self._load(month):
+                if user_id is not None and row[1] != user_id:
+                    continue
+                if not _in_range(row[2], start, end):
+                    continue
+                yield row
+
+    def count(
+        self,
+        start: date | None = None,
+        end: date | None = None,
+        user_id: int | None = None,
+    ) -> int:
+        """
+        Cantidad de filas archivadas del rango (inclusive), desde los totales por mes.
+        Solo se recorren las filas de los meses que el rango corta, y solo al filtrar
+        por usuario.
+        """
+        total = 0
+        for month in self._months_in(start, end):
+            counts = self._month_counts(month)
+            whole = (start is None or start <= month) and (
+                end is None or _next_month(month) <= end + timedelta(days=1)
+            )
+            if user_id is None:
+                total += sum(
+                    n
+                    for day, n in counts.by_day.items()
+                    if whole or _in_range(day, start, end)
+                )
+            elif whole:
+                total += counts.by_user.get(user_id, 0)
+            else:
+                total += sum(
+                    1
+                    for row in self._load(month)
+                    if row[1] == user_id and _in_range(row[2], start, end)
+                )
+        return total
+
+    def _months_in(self, start: date | None, end: date | None) -> list[date]:
+        """Meses archivados que se solapan con el rango, en el orden de `months`."""
+        return [
+            month
+            for month in self.months()
+            if (start is None or _next_month(month) > start)
+            and (end is None or month <= end)
+        ]
+
+    def _month_counts(self, month: date) -> _MonthCounts:
+        path = os.path.join(self._directory, archive_filename(month))
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            entry = self._counts.get(path)
+            if entry is not None and entry[0] == mtime:
+                return entry[1]
+
+        counts = _MonthCounts.from_rows(self._load(month))
+        with self._lock:
+            self._counts[path] = (mtime, counts)
+        return counts
+
+    def _load(self, month: date) -> list[ArchiveRow]:
+        path = os.path.join(self._directory, archive_filename(month))
+        key = (path, os.path.getmtime(path))
+        with self._lock:
+            rows = self._cache.get(key)
+            if rows is not None:
+                self._cache.move_to_end(key)
+                return rows
+
+        with gzip.open(path, "rt", newline="") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            rows = [
+                (
+                    int(entity_id),
+                    int(user_id),
+                    date.fromisoformat(date_str),
+                    datetime.fromisoformat(ts) if ts else None,
+                )
+                for entity_id, user_id, date_str, ts in reader
+            ]
+
+        with self._lock:
+            self._cache[key] = rows
+            while len(self._cache) > self._cache_months:
+                self._cache.popitem(last=False)
+        return rows
+
+
+def _in_range(day: date, start: date | None, end: date | None) -> bool:
+    return (start is None or start <= day) and (end is None or day <= end)
+
+
+def get_attendance_archive() -> AttendanceArchive | None:
+    """Archivo de la aplicación actual, o None si ATTENDANCE_ARCHIVE_DIR no está configurado."""
+    directory = current_app.config.get("ATTENDANCE_ARCHIVE_DIR", "")
+    if not directory:
+        return None
+    archive = current_app.extensions.get("attendance_archive")
+    if archive is None:
+        archive = current_app.extensions.setdefault(
+            "attendance_archive", AttendanceArchive(directory)
+        )
+    return archive
@@ -0,0 +1,230 @@
+import csv
+import io
+import json
+import zlib
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+from datetime import date, datetime
+from functools import cache
+from itertools import islice
+
+# Columnas exportadas, en el orden de las filas de AttendanceService.iter_export_rows
+EXPORT_COLUMNS = ["user_id", "date", "timestamp"]
+
+AttendanceRow = tuple[int, date | None, datetime | None]
+
+
+def iter_csv(rows: Iterable[AttendanceRow], chunk_rows: int = 500) -> Iterator[str]:
+    """
+    Genera el CSV de asistencias por bloques de `chunk_rows` filas, para una respuesta
+    en streaming: la memoria usada no depende de la cantidad de filas exportadas.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for i, (user_id, date_obj, timestamp) in enumerate(rows, 1):
+        writer.writerow(
+            [
+                user_id,
+                date_obj.isoformat() if date_obj else "",
+                timestamp.isoformat() if timestamp else "",
+            ]
+        )
+        if i % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_gzip_csv(rows: Iterable[AttendanceRow]) -> Iterator[bytes]:
+    """CSV comprimido con gzip a medida que se genera (un único miembro gzip)."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: cabecera gzip
+    for chunk in iter_csv(rows, chunk_rows=2000):
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_ndjson(rows: Iterable[AttendanceRow], chunk_rows: int = 500) -> Iterator[str]:
+    """Un objeto JSON por línea con las columnas de EXPORT_COLUMNS (fechas en ISO 8601)."""
+    lines = []
+    for user_id, date_obj, timestamp in rows:
+        lines.append(
+            json.dumps(
+                {
+                    "user_id": user_id,
+                    "date": date_obj.isoformat() if date_obj else None,
+                    "timestamp": timestamp.isoformat() if timestamp else None,
+                }
+            )
+        )
+        if len(lines) == chunk_rows:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+class _ChunkSink:
+    """Destino de escritura para pyarrow que entrega lo escrito por bloques."""
+
+    closed = False
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _arrow_schema(pa):
+    return pa.schema(
+        [
+            ("user_id", pa.int64()),
+            ("date", pa.date32()),
+            ("timestamp", pa.timestamp("us")),
+        ]
+    )
+
+
+def _iter_record_batches(rows: Iterable[AttendanceRow], pa, batch_rows: int):
+    schema = _arrow_schema(pa)
+    rows = iter(rows)
+    while batch := list(islice(rows, batch_rows)):
+        user_ids, dates, timestamps = zip(*batch)
+        yield pa.record_batch(
+            [
+                pa.array(user_ids, pa.int64()),
+                pa.array(dates, pa.date32()),
+                pa.array(timestamps, pa.timestamp("us")),
+            ],
+            schema=schema,
+        )
+
+
+def _iter_arrow(
+    rows: Iterable[AttendanceRow], parquet: bool, batch_rows: int = 65_536
+) -> Iterator[bytes]:
+    """
+    Parquet (un row group por lote) o Arrow IPC en formato stream (un record batch por lote).
+    Cada lote de `batch_rows` filas se escribe y se envía antes de leer el siguiente.
+    """
+    import pyarrow as pa
+
+    def open_writer(sink, schema):
+        if parquet:
+            import pyarrow.parquet as pq
+
+            return pq.ParquetWriter(sink, schema, compression="zstd")
+        return pa.ipc.new_stream(sink, schema)
+
+    sink = _ChunkSink()
+    writer = None
+    for batch in _iter_record_batches(rows, pa, batch_rows):
+        if writer is None:
+            writer = open_writer(sink, batch.schema)
+        writer.write_batch(batch)
+        if data := sink.drain():
+            yield data
+
+    if writer is None:
+        # Sin filas: archivo válido con solo el esquema
+        writer = open_writer(sink, _arrow_schema(pa))
+    writer.close()
+    yield sink.drain()
+
+
+@dataclass(frozen=True)
+class ExportFormat:
+    """Formato de exportación: tipo MIME, extensión del archivo y generador de contenido."""
+
+    name: str
+    mimetype: str
+    extension: str
+    stream: Callable[[Iterable[AttendanceRow]], Iterator[str | bytes]]
+    label: str  # nombre en el menú de exportación
+    requires: str | None = None  # paquete opcional necesario
+
+
+EXPORT_FORMATS = {
+    f.name: f
+    for f in (
+        ExportFormat("csv", "text/csv", "csv", iter_csv, "CSV"),
+        ExportFormat(
+            "csv.gz",
+            "application/gzip",
+            "csv.gz",
+            iter_gzip_csv,
+            "CSV comprimido (.csv.gz)",
+        ),
+        ExportFormat(
+            "ndjson", "application/x-ndjson", "ndjson", iter_ndjson, "NDJSON"
+        ),
+        ExportFormat(
+            "parquet",
+            "application/vnd.apache.parquet",
+            "parquet",
+            lambda rows: _iter_arrow(rows, parquet=True),
+            "Parquet",
+            requires="pyarrow",
+        ),
+        ExportFormat(
+            "arrow",
+            "application/vnd.apache.arrow.stream",
+            "arrows",
+            lambda rows: _iter_arrow(rows, parquet=False),
+            "Arrow IPC",
+            requires="pyarrow",
+        ),
+    )
+}
+
+
+def get_export_format(name: str) -> ExportFormat:
+    """
+    Formato de exportación por nombre (csv, csv.gz, ndjson, parquet, arrow).
+    Lanza ValueError si no existe o si falta su paquete opcional (`pip install pyarrow`).
+    """
+    export_format = EXPORT_FORMATS.get(name)
+    if export_format is None:
+        raise ValueError(f"Formato de exportación no soportado: {name}")
+    if export_format.requires:
+        try:
+            __import__(export_format.requires)
+        except ImportError as e:
+            raise ValueError(
+                f"La exportación {name} requiere el paquete '{export_format.requires}'"
+            ) from e
+    return export_format
+
+
+@cache
+def available_export_formats() -> tuple[ExportFormat, ...]:
+    """Formatos para los que `get_export_format` no falla (paquetes instalados)."""
+    available = []
+    for name in EXPORT_FORMATS:
+        try:
+            available.append(get_export_format(name))
+        except ValueError:
+            continue
+    return tuple(available)
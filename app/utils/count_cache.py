@@ -0,0 +1,35 @@
+from collections.abc import Iterable
+from datetime import date
+
+from app.utils.ttl_cache import TTLCache
+
+# (user_id, start, end); None = sin filtro de usuario o rango abierto
+CountKey = tuple[int | None, date | None, date | None]
+
+
+class CountCache(TTLCache[CountKey, int]):
+    """
+    Caché de totales de asistencias por (user_id, start, end), para que paginar un rango
+    no repita el COUNT completo en cada página.
+    - maxsize: número máximo de totales en memoria (0 desactiva la caché).
+    - ttl: segundos que vive cada total; acota cuánto tarda en verse un alta o baja
+      hecha por otro proceso.
+    Las altas y bajas de este proceso descartan solo los totales cuyo rango y usuario
+    incluyen la asistencia modificada (`invalidate`).
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 30.0) -> None:
+        super().__init__(maxsize, ttl)
+
+    def invalidate(self, user_ids: Iterable[int], day: date) -> None:
+        """Descarta los totales que incluyen asistencias de `user_ids` en `day`."""
+        user_ids = set(user_ids)
+        self._discard(
+            lambda key: (key[0] is None or key[0] in user_ids)
+            and (key[1] is None or key[1] <= day)
+            and (key[2] is None or day <= key[2])
+        )
+
+
+# Caché compartida por el proceso
+count_cache = CountCache()
@@ -0,0 +1,41 @@
+import base64
+from dataclasses import dataclass
+from datetime import date
+
+
+@dataclass(frozen=True)
+class PageCursor:
+    """
+    Posición de una página en un listado ordenado por (date DESC, id DESC).
+    - direction: 'next' (filas posteriores a la clave) o 'prev' (filas anteriores).
+    - date / id: clave de la última (next) o primera (prev) fila de la página vista.
+    - page: número de la página de destino, solo para mostrarlo.
+    """
+
+    direction: str
+    date: date
+    id: int
+    page: int
+
+    def encode(self) -> str:
+        """Cursor opaco apto para URL (base64url sin relleno)."""
+        raw = f"{self.direction[0]}|{self.date.isoformat()}|{self.id}|{self.page}"
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, value: str) -> "PageCursor":
+        """Lanza ValueError si el cursor no es válido."""
+        try:
+            raw = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)).decode()
+            direction, date_str, id_str, page_str = raw.split("|")
+            cursor = cls(
+                direction={"n": "next", "p": "prev"}[direction],
+                date=date.fromisoformat(date_str),
+                id=int(id_str),
+                page=int(page_str),
+            )
+        except (ValueError, KeyError, UnicodeDecodeError) as e:
+            raise ValueError("Cursor de paginación inválido") from e
+        if cursor.id <= 0 or cursor.page < 1:
+            raise ValueError("Cursor de paginación inválido")
+        return cursor
@@ -0,0 +1,88 @@
+import secrets
+import threading
+from collections import deque
+
+from flask import current_app
+
+
+class EventBroker:
+    """
+    Pub/sub en proceso para el feed en vivo (Server-Sent Events).
+    - history: eventos recientes retenidos para reenviar a quien reconecta con Last-Event-ID.
+    - max_subscribers: conexiones simultáneas admitidas (cada una ocupa un worker o greenlet).
+
+    Todos los suscriptores esperan en una misma Condition sobre un historial compartido:
+    publicar es O(1) y no hay colas ni hilos por cliente. Los ids llevan un prefijo por
+    proceso, así un Last-Event-ID emitido por otro worker reanuda desde el evento actual.
+    """
+
+    def __init__(self, history: int = 256, max_subscribers: int = 100) -> None:
+        self._cond = threading.Condition()
+        self._events: deque[tuple[int, dict]] = deque(maxlen=history)
+        self._last_seq = 0
+        self._subscribers = 0
+        self._max_subscribers = max_subscribers
+        self._prefix = secrets.token_hex(4)
+
+    @property
+    def subscribers(self) -> int:
+        return self._subscribers
+
+    def publish(self, event: dict) -> str:
+        """Publica un evento y despierta a los suscriptores; retorna su id."""
+        with self._cond:
+            self._last_seq += 1
+            self._events.append((self._last_seq, event))
+            self._cond.notify_all()
+            return self.event_id(self._last_seq)
+
+    def acquire(self) -> bool:
+        """Reserva un lugar de suscriptor; False si se alcanzó `max_subscribers`."""
+        with self._cond:
+            if self._subscribers >= self._max_subscribers:
+                return False
+            self._subscribers += 1
+            return True
+
+    def release(self) -> None:
+        with self._cond:
+            self._subscribers = max(0, self._subscribers - 1)
+
+    def event_id(self, seq: int) -> str:
+        return f"{self._prefix}-{seq}"
+
+    def resume_from(self, last_event_id: str | None) -> int:
+        """Secuencia desde la que continuar: la del Last-Event-ID si es de este proceso, o la actual."""
+        with self._cond:
+            current = self._last_seq
+        if last_event_id:
+            prefix, _, seq = last_event_id.partition("-")
+            if prefix == self._prefix and seq.isdigit() and int(seq) <= current:
+                return int(seq)
+        return current
+
+    def wait(self, after: int, timeout: float) -> tuple[list[tuple[int, dict]], int]:
+        """
+        Espera hasta `timeout` segundos eventos posteriores a `after`.
+        Retorna (eventos, última secuencia vista); la lista vacía indica que se agotó el tiempo.
+        """
+        with self._cond:
+            if self._last_seq <= after:
+                self._cond.wait(timeout)
+            if self._last_seq <= after:
+                return [], after
+            events = [(seq, e) for seq, e in self._events if seq > after]
+            return events, self._last_seq
+
+
+def get_event_broker() -> EventBroker:
+    """Retorna el broker de eventos de la aplicación actual, creándolo la primera vez."""
+    broker = current_app.extensions.get("event_broker")
+    if broker is None:
+        broker = current_app.extensions.setdefault(
+            "event_broker",
+            EventBroker(
+                max_subscribers=int(current_app.config.get("SSE_MAX_SUBSCRIBERS", 100))
+            ),
+        )
+    return broker
@@ -0,0 +1,47 @@
+from dataclasses import dataclass
+
+from app.utils.ttl_cache import TTLCache
+
+
+@dataclass(frozen=True)
+class Identity:
+    """Vista liviana del usuario autenticado, sin sesión ORM: se comparte entre peticiones."""
+
+    id: int
+    username: str
+    role_id: int
+    role_name: str | None
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role_name == "Admin"
+
+    @classmethod
+    def from_model(cls, user) -> "Identity":
+        return cls(
+            id=user.id,
+            username=user.username,
+            role_id=user.role_id,
+            role_name=user.role.name if user.role else None,
+        )
+
+
+class IdentityCache(TTLCache[int, Identity]):
+    """
+    Caché de identidades por user_id, compartida entre peticiones.
+    - maxsize: número máximo de identidades en memoria (0 desactiva la caché).
+    - ttl: segundos que vive cada identidad; acota cuánto tarda en verse un cambio de
+      nombre, rol o una baja hecha por otro proceso.
+    `UserRepository.update` y `delete` invalidan la identidad del usuario en este proceso.
+    """
+
+    def set(self, identity: Identity, generation: int) -> None:
+        """Guarda la identidad si no hubo invalidaciones desde que se leyó `generation`."""
+        super().set(identity.id, identity, generation)
+
+    def invalidate(self, user_id: int) -> None:
+        self._discard(lambda key: key == user_id)
+
+
+# Caché compartida por el proceso
+identity_cache = IdentityCache()
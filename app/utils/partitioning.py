@@ -0,0 +1,309 @@
+import os
+import re
+from datetime import date
+
+from sqlalchemy import text
+from sqlalchemy.schema import CreateIndex
+
+from app import db
+from app.utils.attendance_archive import archive_filename, write_archive
+
+TABLE = "attendances"
+DEFAULT_PARTITION = "attendances_default"
+
+_PARTITION = re.compile(r"^attendances_p(\d{4})(\d{2})$")
+
+# Sin PRIMARY KEY (id): en una tabla particionada la clave debe incluir la columna de
+# partición, por eso es (id, date) y la unicidad diaria (user_id, date) se mantiene.
+_TABLE_DDL = """
+CREATE TABLE {name} (
+    id INTEGER NOT NULL DEFAULT nextval('attendances_id_seq'),
+    user_id INTEGER NOT NULL,
+    "timestamp" TIMESTAMP WITHOUT TIME ZONE,
+    date DATE NOT NULL
+) PARTITION BY RANGE (date)
+"""
+
+_CONSTRAINTS_DDL = [
+    "ALTER TABLE attendances ADD CONSTRAINT attendances_pkey PRIMARY KEY (id, date)",
+    "ALTER TABLE attendances ADD CONSTRAINT unique_daily_attendance "
+    "UNIQUE (user_id, date)",
+    "ALTER TABLE attendances ADD CONSTRAINT attendances_user_id_fkey "
+    "FOREIGN KEY (user_id) REFERENCES users (id)",
+]
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, n: int) -> date:
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"attendances_p{month:%Y%m}"
+
+
+def _require_postgresql(engine) -> None:
+    if engine.dialect.name != "postgresql":
+        raise ValueError("El particionado de asistencias requiere PostgreSQL")
+
+
+def _require_partitioned(engine) -> None:
+    _require_postgresql(engine)
+    if not is_partitioned(engine):
+        raise ValueError(
+            "La tabla attendances no está particionada (flask partitions setup)"
+        )
+
+
+def is_partitioned(engine=None, table: str = TABLE) -> bool:
+    """True si `table` es una tabla particionada de PostgreSQL."""
+    engine = engine or db.engine
+    if engine.dialect.name != "postgresql":
+        return False
+    with engine.connect() as conn:
+        return conn.execute(
+            text(
+                "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table pt "
+                "JOIN pg_class c ON c.oid = pt.partrelid "
+                "WHERE c.relname = :name AND pg_table_is_visible(c.oid))"
+            ),
+            {"name": table},
+        ).scalar()
+
+
+def list_partitions(engine=None) -> list[date]:
+    """Meses con partición propia en `attendances`, del más antiguo al más reciente."""
+    engine = engine or db.engine
+    with engine.connect() as conn:
+        return _list_partitions(conn)
+
+
+def _list_partitions(conn) -> list[date]:
+    names = conn.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :name AND pg_table_is_visible(p.oid)"
+        ),
+        {"name": TABLE},
+    ).scalars()
+    months = []
+    for name in names:
+        match = _PARTITION.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def _create_partition(conn, month: date, parent: str = TABLE) -> None:
+    conn.execute(
+        text(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {parent} "
+            f"FOR VALUES FROM ('{month.isoformat()}') "
+            f"TO ('{add_months(month, 1).isoformat()}')"
+        )
+    )
+
+
+def _add_month_partition(conn, month: date) -> int:
+    """
+    Crea la partición del mes en `attendances`. Las filas del mes que ya cayeron en la
+    partición DEFAULT impiden crearla con PARTITION OF: se crea como tabla suelta, se
+    mueven esas filas a ella y se adjunta (ATTACH), todo en la transacción de `conn`.
+    Retorna las filas movidas desde DEFAULT.
+    """
+    name = partition_name(month)
+    bounds = {"start": month, "end": add_months(month, 1)}
+    has_default = conn.execute(
+        text("SELECT to_regclass(:name) IS NOT NULL"), {"name": DEFAULT_PARTITION}
+    ).scalar()
+    if not has_default or not conn.execute(
+        text(
+            f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} "
+            "WHERE date >= :start AND date < :end)"
+        ),
+        bounds,
+    ).scalar():
+        _create_partition(conn, month)
+        return 0
+
+    # Bloquear altas en DEFAULT mientras se mueven sus filas del mes
+    conn.execute(text(f"LOCK TABLE {DEFAULT_PARTITION} IN EXCLUSIVE MODE"))
+    conn.execute(text(f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS)"))
+    moved = conn.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+            "WHERE date >= :start AND date < :end "
+            'RETURNING id, user_id, "timestamp", date) '
+            f'INSERT INTO {name} (id, user_id, "timestamp", date) '
+            'SELECT id, user_id, "timestamp", date FROM moved'
+        ),
+        bounds,
+    ).rowcount
+    # ATTACH crea en la partición los índices y restricciones de attendances
+    conn.execute(
+        text(
+            f"ALTER TABLE {TABLE} ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{month.isoformat()}') "
+            f"TO ('{add_months(month, 1).isoformat()}')"
+        )
+    )
+    return moved
+
+
+def _create_partitioned(conn, months: list[date], parent: str = TABLE) -> None:
+    conn.execute(text("CREATE SEQUENCE IF NOT EXISTS attendances_id_seq"))
+    conn.execute(text(_TABLE_DDL.format(name=parent)))
+    for month in months:
+        _create_partition(conn, month, parent)
+    conn.execute(
+        text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {parent} DEFAULT")
+    )
+
+
+def _add_constraints(conn) -> None:
+    """Clave primaria, unicidad diaria, FK e índices del modelo (se propagan a cada partición)."""
+    from app.models.attendance import Attendance
+
+    for ddl in _CONSTRAINTS_DDL:
+        conn.execute(text(ddl))
+    conn.execute(text("ALTER SEQUENCE attendances_id_seq OWNED BY attendances.id"))
+    for index in Attendance.__table__.indexes:
+        conn.execute(CreateIndex(index))
+
+
+def create_partitioned_table(engine=None, months_ahead: int = 3) -> list[str]:
+    """
+    Crea `attendances` vacía particionada por mes (desde el mes actual hasta
+    `months_ahead` meses adelante, más una partición DEFAULT). Para bases nuevas,
+    antes de `create_all`. Retorna las particiones creadas.
+    """
+    engine = engine or db.engine
+    _require_postgresql(engine)
+    current = month_start(date.today())
+    months = [add_months(current, n) for n in range(months_ahead + 1)]
+    with engine.begin() as conn:
+        _create_partitioned(conn, months)
+        _add_constraints(conn)
+    return [partition_name(m) for m in months]
+
+
+def convert_to_partitioned(engine=None, months_ahead: int = 3) -> list[str]:
+    """
+    Convierte una tabla `attendances` existente en particionada por mes, copiando sus
+    filas, en una sola transacción (bloquea escrituras mientras dura: ejecutar en una
+    ventana de mantenimiento). Conserva los ids y la secuencia. Retorna las particiones.
+    """
+    engine = engine or db.engine
+    _require_postgresql(engine)
+    if is_partitioned(engine):
+        raise ValueError("La tabla attendances ya está particionada")
+
+    with engine.begin() as conn:
+        conn.execute(text("LOCK TABLE attendances IN EXCLUSIVE MODE"))
+        first, last = conn.execute(
+            text("SELECT min(date), max(date) FROM attendances")
+        ).one()
+        current = month_start(date.today())
+        month = month_start(first) if first else current
+        stop = add_months(max(current, month_start(last or current)), months_ahead)
+        months = []
+        while month <= stop:
+            months.append(month)
+            month = add_months(month, 1)
+
+        _create_partitioned(conn, months, parent="attendances_partitioned")
+        conn.execute(
+            text(
+                'INSERT INTO attendances_partitioned (id, user_id, "timestamp", date) '
+                'SELECT id, user_id, "timestamp", COALESCE(date, "timestamp"::date) '
+                "FROM attendances"
+            )
+        )
+        # La secuencia pertenece a la tabla vieja: desvincularla antes de eliminarla
+        conn.execute(text("ALTER SEQUENCE attendances_id_seq OWNED BY NONE"))
+        conn.execute(text("DROP TABLE attendances"))
+        conn.execute(text("ALTER TABLE attendances_partitioned RENAME TO attendances"))
+        _add_constraints(conn)
+        conn.execute(
+            text(
+                "SELECT setval('attendances_id_seq', "
+                "COALESCE((SELECT max(id) FROM attendances), 0) + 1, false)"
+            )
+        )
+    return [partition_name(m) for m in months]
+
+
+def ensure_partitions(engine=None, months_ahead: int = 3) -> list[str]:
+    """
+    Crea las particiones mensuales que falten desde el mes actual hasta `months_ahead`
+    meses adelante, así las altas nunca caen en la partición DEFAULT. Las asistencias
+    de esos meses que ya estaban en DEFAULT se mueven a su partición. Es idempotente;
+    retorna las particiones creadas.
+    """
+    engine = engine or db.engine
+    _require_partitioned(engine)
+    current = month_start(date.today())
+    created = []
+    with engine.begin() as conn:
+        existing = set(_list_partitions(conn))
+        for n in range(months_ahead + 1):
+            month = add_months(current, n)
+            if month not in existing:
+                _add_month_partition(conn, month)
+                created.append(partition_name(month))
+    return created
+
+
+def archive_partitions(
+    archive_dir: str, live_months: int, engine=None
+) -> list[tuple[str, int]]:
+    """
+    Archiva los meses anteriores a los últimos `live_months` (incluido el actual):
+    escribe cada partición en `archive_dir/attendances_YYYYMM.csv.gz` y luego la separa
+    (DETACH) y elimina. El resumen `attendance_daily_stats` se conserva. Un mes cuyo
+    archivo ya existe no se sobrescribe. Retorna (partición, filas archivadas).
+    """
+    engine = engine or db.engine
+    _require_partitioned(engine)
+    if not archive_dir:
+        raise ValueError("ATTENDANCE_ARCHIVE_DIR no está configurado")
+    if live_months < 1:
+        raise ValueError("live_months debe ser un entero positivo")
+    os.makedirs(archive_dir, exist_ok=True)
+
+    cutoff = add_months(month_start(date.today()), -(live_months - 1))
+    archived = []
+    for month in list_partitions(engine):
+        if month >= cutoff:
+            break
+        name = partition_name(month)
+        path = os.path.join(archive_dir, archive_filename(month))
+        if os.path.exists(path):
+            raise ValueError(f"El archivo {path} ya existe; no se archiva {name}")
+
+        try:
+            with engine.begin() as conn:
+                # Bloquear altas y bajas del mes mientras se copia y se separa
+                conn.execute(text(f"LOCK TABLE {name} IN SHARE MODE"))
+                result = conn.execute(
+                    text(
+                        f'SELECT id, user_id, date, "timestamp" FROM {name} '
+                        "ORDER BY date DESC, id DESC"
+                    ).execution_options(yield_per=5000)
+                )
+                count = write_archive(path, (tuple(row) for row in result))
+                conn.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {name}"))
+                conn.execute(text(f"DROP TABLE {name}"))
+        except Exception:
+            # Sin commit la partición sigue en la base: descartar el archivo
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+        archived.append((name, count))
+    return archived
@@ -1,10 +1,58 @@
 import base64
+import binascii
 import hashlib
 import hmac
 import io
+import struct
+import threading
 import time
+import zlib
 
 import qrcode
+from qrcode.exceptions import DataOverflowError
+
+from app.utils.ttl_cache import TTLCache
+
+# Renderizadores disponibles y el tipo MIME de la imagen que producen:
+# - pil: ruta original (make(fit=True) + Pillow).
+# - png: versión y máscara fijas, PNG de 1 bit escrito directamente (sin Pillow).
+# - svg: versión y máscara fijas, SVG compacto de un solo path (sin Pillow).
+IMAGE_MIMETYPES = {"pil": "image/png", "png": "image/png", "svg": "image/svg+xml"}
+
+# Formatos de token:
+# - text: 'user_id:timestamp:<firma hex>' (~80 caracteres, modo byte del QR).
+# - compact: struct (user_id, timestamp) + HMAC truncado en base32, 24 caracteres
+#   alfanuméricos que caben en un QR versión 1.
+TOKEN_FORMATS = ("text", "compact")
+COMPACT_MAC_BYTES = 7
+_COMPACT_PAYLOAD = struct.Struct(">II")
+COMPACT_TOKEN_LENGTH = (_COMPACT_PAYLOAD.size + COMPACT_MAC_BYTES) * 8 // 5
+
+# Máscara fija para los renderizadores rápidos (cualquier máscara es válida al decodificar)
+FAST_MASK_PATTERN = 0
+
+# Versión QR mínima ya calculada por (longitud, modo) del token
+_versions: dict[tuple[int, int], int] = {}
+
+
+class QRImageCache(TTLCache[str, bytes]):
+    """
+    Caché de imágenes QR ya renderizadas (bytes).
+    - maxsize: número máximo de imágenes en memoria (0 desactiva la caché).
+    - Cada entrada expira cuando termina la ventana de validez de su token;
+      pasado ese momento nadie vuelve a servir esa imagen.
+    """
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        super().__init__(maxsize)
+
+    def set(self, key: str, value: bytes, expires_at: float) -> None:
+        """Guarda la imagen del token hasta `expires_at` (epoch en segundos)."""
+        super().set(key, value, ttl=expires_at - time.time())
+
+
+# Caché compartida por todos los generadores del proceso
+image_cache = QRImageCache()
 
 
 class QRGenerator:
@@ -12,19 +60,41 @@ class QRGenerator:
     - secret_key: clave secreta usada para firmar tokens.
     - expiration: ventana de expiración recomendada del token (segundos). Se mantiene como configuración interna.
     - tolerance: tolerancia de tiempo (segundos) para la validación de tokens.
+    - windowed: si es True, el timestamp del token se alinea al inicio de la ventana
+      de `expiration`, de modo que el token de un usuario es el mismo durante toda la ventana.
+    - renderer: backend de imagen, una de las claves de IMAGE_MIMETYPES.
+    - token_format: formato de los tokens generados ('text' o 'compact'). La validación
+      acepta ambos formatos.
+
+    El contexto HMAC con la clave ya cargada se prepara una sola vez y se clona por firma.
     """
 
+    box_size = 10
+    border = 4
+
     def __init__(
-        self, secret_key: str, expiration: int = 60, tolerance: int = 90
+        self,
+        secret_key: str,
+        expiration: int = 60,
+        tolerance: int = 90,
+        windowed: bool = False,
+        renderer: str = "pil",
+        token_format: str = "text",
     ) -> None:
 
         self._secret_key: str = ""
+        self._hmac = None
         self._expiration: int = 0
         self._tolerance: int = 0
+        self._renderer: str = ""
+        self._token_format: str = ""
 
         self.secret_key = secret_key
         self.expiration = expiration
         self.tolerance = tolerance
+        self.windowed = bool(windowed)
+        self.renderer = renderer
+        self.token_format = token_format
 
     @property
     def secret_key(self) -> str:
@@ -35,6 +105,7 @@ class QRGenerator:
         if not isinstance(value, str) or not value.strip():
             raise ValueError("secret_key debe ser un string no vacío")
         self._secret_key = value
+        self._hmac = hmac.new(value.encode(), digestmod=hashlib.sha256)
 
     @property
     def expiration(self) -> int:
@@ -56,20 +127,54 @@ class QRGenerator:
             raise ValueError("tolerance debe ser un entero positivo (segundos)")
         self._tolerance = value
 
+    @property
+    def renderer(self) -> str:
+        return self._renderer
+
+    @renderer.setter
+    def renderer(self, value: str) -> None:
+        if value not in IMAGE_MIMETYPES:
+            raise ValueError(
+                f"renderer debe ser uno de: {', '.join(IMAGE_MIMETYPES)}"
+            )
+        self._renderer = value
+
+    @property
+    def token_format(self) -> str:
+        return self._token_format
+
+    @token_format.setter
+    def token_format(self, value: str) -> None:
+        if value not in TOKEN_FORMATS:
+            raise ValueError(
+                f"token_format debe ser uno de: {', '.join(TOKEN_FORMATS)}"
+            )
+        self._token_format = value
+
+    @property
+    def mimetype(self) -> str:
+        return IMAGE_MIMETYPES[self.renderer]
+
     def generate_token(self, user_id: int) -> str:
         """
         Genera un token firmado para el usuario con el formato:
         'user_id:timestamp:signature'
+        o, con token_format='compact', base32(user_id, timestamp, HMAC truncado).
+        En modo `windowed` el timestamp es el inicio de la ventana actual.
         """
         if not isinstance(user_id, int) or user_id <= 0:
             raise ValueError("user_id debe ser un entero positivo")
 
-        timestamp = int(time.time())
+        timestamp = self.current_window() if self.windowed else int(time.time())
+        if self.token_format == "compact":
+            if user_id > 0xFFFFFFFF:
+                raise ValueError("user_id no cabe en un token compacto")
+            packed = _COMPACT_PAYLOAD.pack(user_id, timestamp)
+            signature = self._sign_bytes(packed)[:COMPACT_MAC_BYTES]
+            return base64.b32encode(packed + signature).decode()
+
         payload = f"{user_id}:{timestamp}"
-        signature = hmac.new(
-            self.secret_key.encode(), payload.encode(), hashlib.sha256
-        ).hexdigest()
-        return f"{payload}:{signature}"
+        return f"{payload}:{self._sign(payload)}"
 
     def validate_token(self, token: str) -> int | None:
         """
@@ -78,7 +183,42 @@ class QRGenerator:
         - Formato correcto
         - No exceder la tolerancia temporal
         - Firma HMAC SHA-256 válida
+        Acepta tanto tokens de texto como compactos.
+        En modo `windowed` la tolerancia se cuenta desde el fin de la ventana del token,
+        así se aceptan los tokens de la ventana actual y de la anterior.
+        """
+        return self._validate(token, time.time())
+
+    def validate_tokens(self, tokens: list[str]) -> list[int | None]:
+        """
+        Valida un lote de tokens (p. ej. los que envía un escáner de una sola vez).
+        Retorna, en el mismo orden, el user_id de cada token válido o None.
         """
+        now = time.time()
+        return [self._validate(token, now) for token in tokens]
+
+    def _sign(self, payload: str) -> str:
+        signer = self._hmac.copy()
+        signer.update(payload.encode())
+        return signer.hexdigest()
+
+    def _sign_bytes(self, payload: bytes) -> bytes:
+        signer = self._hmac.copy()
+        signer.update(payload)
+        return signer.digest()
+
+    def _is_fresh(self, timestamp: int, now: float) -> bool:
+        max_age = self.tolerance + (self.expiration if self.windowed else 0)
+        return now - timestamp <= max_age
+
+    def _validate(self, token: str, now: float) -> int | None:
+        if not isinstance(token, str):
+            return None
+        if ":" in token:
+            return self._validate_text(token, now)
+        return self._validate_compact(token, now)
+
+    def _validate_text(self, token: str, now: float) -> int | None:
         try:
             parts = token.split(":")
             if len(parts) != 3:
@@ -88,14 +228,10 @@ class QRGenerator:
         except (ValueError, IndexError):
             return None
 
-        if time.time() - timestamp > self.tolerance:
+        if not self._is_fresh(timestamp, now):
             return None
 
-        expected_sig = hmac.new(
-            self.secret_key.encode(),
-            f"{user_id_str}:{timestamp_str}".encode(),
-            hashlib.sha256,
-        ).hexdigest()
+        expected_sig = self._sign(f"{user_id_str}:{timestamp_str}")
 
         if not hmac.compare_digest(expected_sig, signature):
             return None
@@ -105,16 +241,89 @@ class QRGenerator:
         except ValueError:
             return None
 
+    def _validate_compact(self, token: str, now: float) -> int | None:
+        if len(token) != COMPACT_TOKEN_LENGTH:
+            return None
+        try:
+            raw = base64.b32decode(token)
+        except (binascii.Error, ValueError):
+            return None
+
+        packed, signature = raw[: _COMPACT_PAYLOAD.size], raw[_COMPACT_PAYLOAD.size :]
+        user_id, timestamp = _COMPACT_PAYLOAD.unpack(packed)
+
+        if not self._is_fresh(timestamp, now):
+            return None
+
+        expected_sig = self._sign_bytes(packed)[:COMPACT_MAC_BYTES]
+        if not hmac.compare_digest(expected_sig, signature):
+            return None
+
+        return user_id or None
+
+    def _token_timestamp(self, token: str) -> int | None:
+        """Timestamp embebido en el token (texto o compacto), sin verificar la firma."""
+        try:
+            if ":" in token:
+                return int(token.split(":")[1])
+            if len(token) == COMPACT_TOKEN_LENGTH:
+                raw = base64.b32decode(token)
+                return _COMPACT_PAYLOAD.unpack(raw[: _COMPACT_PAYLOAD.size])[1]
+        except (binascii.Error, ValueError, IndexError):
+            pass
+        return None
+
+    def current_window(self) -> int:
+        """Inicio (epoch en segundos) de la ventana de `expiration` actual."""
+        now = int(time.time())
+        return now - now % self.expiration
+
+    def token_expires_at(self, token: str) -> float:
+        """
+        Momento (epoch en segundos) en que termina la ventana de expiración del token.
+        Si el token no trae un timestamp legible, se cuenta desde ahora.
+        """
+        timestamp = self._token_timestamp(token)
+        if timestamp is None:
+            timestamp = int(time.time())
+        return timestamp + self.expiration
+
+    def render(self, token: str) -> bytes:
+        """
+        Renderiza el QR del token con el backend configurado y retorna los bytes de la imagen.
+        En modo `windowed` las imágenes se reutilizan desde `image_cache` mientras el token
+        siga vigente; sin ventanas cada token es distinto y no se cachean.
+        """
+        key = f"{self.renderer}:{token}"
+        if self.windowed:
+            cached = image_cache.get(key)
+            if cached is not None:
+                return cached
+
+        if self.renderer == "pil":
+            image = self._render_pil(token)
+        elif self.renderer == "png":
+            image = self._render_png(self._build_matrix(token))
+        else:
+            image = self._render_svg(self._build_matrix(token))
+
+        if self.windowed:
+            image_cache.set(key, image, self.token_expires_at(token))
+        return image
+
     def generate_image(self, token: str) -> str:
         """
         Genera una imagen QR en base64 a partir de un token.
-        Retorna el PNG codificado en base64.
+        Retorna la imagen (PNG o SVG según `renderer`) codificada en base64.
         """
+        return base64.b64encode(self.render(token)).decode()
+
+    def _render_pil(self, token: str) -> bytes:
         qr = qrcode.QRCode(
             version=1,
             error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
+            box_size=self.box_size,
+            border=self.border,
         )
         qr.add_data(token)
         qr.make(fit=True)
@@ -123,30 +332,175 @@ class QRGenerator:
 
         buffer = io.BytesIO()
         img.save(buffer, format="PNG")
-        buffer.seek(0)
+        return buffer.getvalue()
+
+    def _build_matrix(self, token: str) -> list[list[bool]]:
+        """
+        Construye la matriz de módulos con versión precalculada y máscara fija,
+        evitando la búsqueda de versión y la evaluación de las ocho máscaras.
+        """
+        key = (len(token), qrcode.util.optimal_mode(token.encode()))
+        qr = qrcode.QRCode(
+            version=_versions.get(key),
+            error_correction=qrcode.constants.ERROR_CORRECT_L,
+            mask_pattern=FAST_MASK_PATTERN,
+        )
+        qr.add_data(token)
+        try:
+            qr.make(fit=False)
+        except DataOverflowError:
+            # El token no cabe en la versión cacheada: recalcular
+            qr.best_fit()
+            qr.make(fit=False)
+        _versions[key] = max(_versions.get(key, 1), qr.version)
+        return qr.modules
 
-        img_base64 = base64.b64encode(buffer.getvalue()).decode()
-        return img_base64
+    def _render_png(self, modules: list[list[bool]]) -> bytes:
+        """Escribe la matriz como PNG en escala de grises de 1 bit (0 = negro)."""
+        box, border = self.box_size, self.border
+        size = (len(modules) + 2 * border) * box
+        row_bytes = (size + 7) // 8
+        padding = "1" * (row_bytes * 8 - size)
+        quiet = "1" * (border * box)
 
-def generate_qr_token(user_id, secret_key, expiration=60):
+        blank_row = b"\x00" + int(
+            "1" * (row_bytes * 8), 2
+        ).to_bytes(row_bytes, "big")
+        rows = [blank_row * (border * box)]
+        for module_row in modules:
+            bits = quiet + "".join("0" * box if m else "1" * box for m in module_row)
+            line = b"\x00" + int(bits + quiet + padding, 2).to_bytes(row_bytes, "big")
+            rows.append(line * box)
+        rows.append(blank_row * (border * box))
+
+        def chunk(kind: bytes, data: bytes) -> bytes:
+            return (
+                struct.pack(">I", len(data))
+                + kind
+                + data
+                + struct.pack(">I", zlib.crc32(kind + data))
+            )
+
+        header = struct.pack(">IIBBBBB", size, size, 1, 0, 0, 0, 0)
+        return (
+            b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", header)
+            + chunk(b"IDAT", zlib.compress(b"".join(rows), 6))
+            + chunk(b"IEND", b"")
+        )
+
+    def _render_svg(self, modules: list[list[bool]]) -> bytes:
+        """Escribe la matriz como SVG con un único path (un subpath por tramo horizontal)."""
+        border = self.border
+        dim = len(modules) + 2 * border
+        path = []
+        for y, module_row in enumerate(modules, start=border):
+            x = 0
+            while x < len(module_row):
+                if not module_row[x]:
+                    x += 1
+                    continue
+                start = x
+                while x < len(module_row) and module_row[x]:
+                    x += 1
+                path.append(f"M{start + border} {y}h{x - start}v1h{start - x}z")
+        pixels = dim * self.box_size
+        return (
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{pixels}" '
+            f'height="{pixels}" viewBox="0 0 {dim} {dim}" shape-rendering="crispEdges">'
+            f'<rect width="{dim}" height="{dim}" fill="#fff"/>'
+            f'<path d="{"".join(path)}" fill="#000"/></svg>'
+        ).encode()
+
+# Generadores compartidos por configuración; no deben modificarse tras obtenerlos
+_generators: dict[tuple, QRGenerator] = {}
+_generators_lock = threading.Lock()
+
+
+def get_generator(
+    secret_key,
+    expiration=60,
+    tolerance=90,
+    windowed=False,
+    renderer="pil",
+    token_format="text",
+):
+    """
+    Retorna el QRGenerator del proceso para esta configuración, creándolo la primera vez.
+    Evita repetir las validaciones y la preparación de la clave HMAC en cada llamada.
+    """
+    key = (secret_key, expiration, tolerance, bool(windowed), renderer, token_format)
+    generator = _generators.get(key)
+    if generator is None:
+        with _generators_lock:
+            generator = _generators.get(key)
+            if generator is None:
+                generator = QRGenerator(
+                    secret_key=secret_key,
+                    expiration=expiration,
+                    tolerance=tolerance,
+                    windowed=windowed,
+                    renderer=renderer,
+                    token_format=token_format,
+                )
+                _generators[key] = generator
+    return generator
+
+def generate_qr_token(
+    user_id, secret_key, expiration=60, windowed=False, token_format="text"
+):
     """
     Compatibilidad: genera token usando QRGenerator.
     """
-    generator = QRGenerator(secret_key=secret_key, expiration=expiration)
+    generator = get_generator(
+        secret_key,
+        expiration=expiration,
+        windowed=windowed,
+        token_format=token_format,
+    )
     return generator.generate_token(user_id)
 
-def validate_qr_token(token, secret_key, tolerance=90):
+def qr_token_expires_at(token, expiration=60):
+    """
+    Compatibilidad: momento (epoch) en que termina la ventana de expiración del token.
+    """
+    generator = get_generator("__unused__", expiration=expiration)
+    return generator.token_expires_at(token)
+
+def validate_qr_token(token, secret_key, tolerance=90, expiration=60, windowed=False):
     """
     Compatibilidad: valida token usando QRGenerator con la tolerancia indicada.
     """
-    generator = QRGenerator(secret_key=secret_key, tolerance=tolerance)
+    generator = get_generator(
+        secret_key, expiration=expiration, tolerance=tolerance, windowed=windowed
+    )
     return generator.validate_token(token)
 
-def generate_qr_image(token):
+def validate_qr_tokens(
+    tokens, secret_key, tolerance=90, expiration=60, windowed=False
+):
     """
-    Compatibilidad: genera imagen QR en base64 usando QRGenerator.
+    Valida un lote de tokens; retorna el user_id (o None) de cada uno en el mismo orden.
     """
+    generator = get_generator(
+        secret_key, expiration=expiration, tolerance=tolerance, windowed=windowed
+    )
+    return generator.validate_tokens(tokens)
 
-    generator = QRGenerator(secret_key="__unused__", tolerance=90, expiration=60)
-    return generator.generate_image(token)
+def render_qr_image(token, expiration=60, renderer="pil", windowed=False):
+    """
+    Compatibilidad: genera los bytes de la imagen QR usando QRGenerator.
+    """
+    generator = get_generator(
+        "__unused__", expiration=expiration, windowed=windowed, renderer=renderer
+    )
+    return generator.render(token)
 
+def generate_qr_image(token, expiration=60, renderer="pil", windowed=False):
+    """
+    Compatibilidad: genera imagen QR en base64 usando QRGenerator.
+    """
+    generator = get_generator(
+        "__unused__", expiration=expiration, windowed=windowed, renderer=renderer
+    )
+    return generator.generate_image(token)
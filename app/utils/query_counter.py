@@ -0,0 +1,37 @@
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    """Suma una consulta al contador de la petición actual, si está activo"""
+    if has_app_context() and "query_count" in g:
+        g.query_count += 1
+
+
+def get_query_count() -> int | None:
+    """Consultas SQL ejecutadas en la petición actual, o None si el contador está desactivado"""
+    if has_app_context():
+        return g.get("query_count")
+    return None
+
+
+def init_query_counter(app) -> None:
+    """
+    Cuenta las sentencias SQL de cada petición (SQL_QUERY_COUNTER): la cantidad se envía en
+    la cabecera `X-Query-Count` y en el log de depuración, para comprobar que cada vista
+    ejecuta un número constante de consultas.
+    """
+
+    @app.before_request
+    def _start_query_count():
+        g.query_count = 0
+
+    @app.after_request
+    def _report_query_count(response):
+        count = get_query_count()
+        if count is not None:
+            response.headers["X-Query-Count"] = str(count)
+            app.logger.debug(f"{request.method} {request.path}: {count} consultas SQL")
+        return response
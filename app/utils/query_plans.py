@@ -0,0 +1,83 @@
+import re
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import func, select, text, tuple_
+
+from app import db
+from app.models.attendance import Attendance
+
+# Recorrido completo de attendances (o de una de sus particiones) en el plan
+_FULL_SCAN = {
+    "sqlite": re.compile(r"^SCAN attendances\b(?! USING)"),
+    "postgresql": re.compile(r"Seq Scan on attendances\w*"),
+}
+
+
+def attendance_queries(today: date | None = None) -> dict[str, object]:
+    """
+    Las consultas sobre attendances de los listados, exportaciones y conteos, con las
+    mismas condiciones y orden que AttendanceRepository, por nombre.
+    """
+    today = today or date.today()
+    start = today - timedelta(days=90)
+    newest_first = (Attendance.date.desc(), Attendance.id.desc())
+    row = (Attendance.id, Attendance.user_id, Attendance.date, Attendance.timestamp)
+    return {
+        "página por rango": select(*row)
+        .where(Attendance.date >= start, Attendance.date <= today)
+        .order_by(*newest_first)
+        .limit(20),
+        "página por clave": select(*row)
+        .where(tuple_(Attendance.date, Attendance.id) < tuple_(today, 2**31 - 1))
+        .order_by(*newest_first)
+        .limit(21),
+        "conteo por rango": select(func.count(Attendance.id)).where(
+            Attendance.date >= start, Attendance.date <= today
+        ),
+        "exportación": select(Attendance.user_id, Attendance.date, Attendance.timestamp)
+        .where(Attendance.date >= start)
+        .order_by(*newest_first),
+        "recientes": select(*row).order_by(*newest_first).limit(10),
+        "historial por usuario": select(*row)
+        .where(Attendance.user_id == 1)
+        .order_by(*newest_first),
+        "por hora": select(*row).where(
+            Attendance.timestamp >= datetime.combine(start, time()),
+            Attendance.timestamp < datetime.combine(today, time()),
+        ),
+    }
+
+
+def explain_attendance_queries(engine=None) -> list[tuple[str, list[str], bool]]:
+    """
+    Plan de ejecución de cada consulta de `attendance_queries`.
+    Retorna (nombre, líneas del plan, recorre_la_tabla). En PostgreSQL se desactiva
+    enable_seqscan durante el EXPLAIN: con pocas filas el planificador prefiere
+    recorrer la tabla aunque exista un índice, y así un Seq Scan solo queda cuando
+    ningún índice sirve para la consulta.
+    """
+    engine = engine or db.engine
+    dialect = engine.dialect.name
+    if dialect not in _FULL_SCAN:
+        raise ValueError(f"EXPLAIN no soportado para {dialect}")
+    prefix = "EXPLAIN QUERY PLAN " if dialect == "sqlite" else "EXPLAIN "
+
+    results = []
+    with engine.connect() as conn:
+        if dialect == "postgresql":
+            conn.execute(text("SET LOCAL enable_seqscan = off"))
+        else:
+            # EXPLAIN no lee la base: una lectura recarga el esquema si otra conexión
+            # creó o eliminó índices desde que esta lo cargó
+            conn.execute(text("SELECT count(*) FROM sqlite_master"))
+        for name, stmt in attendance_queries().items():
+            compiled = stmt.compile(
+                dialect=engine.dialect, compile_kwargs={"literal_binds": True}
+            )
+            rows = conn.exec_driver_sql(prefix + str(compiled)).all()
+            # SQLite: (id, parent, notused, detail); PostgreSQL: una línea por fila
+            lines = [row[-1] for row in rows]
+            full_scan = any(_FULL_SCAN[dialect].search(line.strip()) for line in lines)
+            results.append((name, lines, full_scan))
+        conn.rollback()
+    return results
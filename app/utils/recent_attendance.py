@@ -0,0 +1,106 @@
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import date, datetime
+
+
+@dataclass(frozen=True)
+class RecentAttendance:
+    """Vista liviana de una asistencia reciente, sin relaciones que cargar."""
+
+    user_id: int
+    username: str | None
+    date: date | None
+    timestamp: datetime | None
+
+    @classmethod
+    def from_model(cls, attendance) -> "RecentAttendance":
+        user = attendance.user
+        return cls(
+            user_id=attendance.user_id,
+            username=user.username if user else None,
+            date=attendance.date,
+            timestamp=attendance.timestamp,
+        )
+
+
+class RecentAttendanceBuffer:
+    """
+    Buffer circular por proceso con las últimas asistencias registradas (más reciente primero).
+    - maxlen: cantidad de asistencias guardadas (0 lo desactiva).
+    - ttl: segundos tras los que se vuelve a leer la base de datos (0 = nunca).
+    Se precarga desde la base de datos y luego lo alimenta el registro de asistencias de
+    este proceso, así la lista de recientes del escáner no necesita consultas. Con varios
+    workers, lo registrado por los demás aparece al releer la base (cada `ttl` segundos).
+    """
+
+    def __init__(self, maxlen: int = 0, ttl: float = 30.0) -> None:
+        self._lock = threading.Lock()
+        self._entries: deque[RecentAttendance] = deque()
+        self._warm = False
+        self._warmed_at = 0.0
+        self._maxlen = 0
+        self.ttl = ttl
+
+        self.maxlen = maxlen
+
+    @property
+    def maxlen(self) -> int:
+        return self._maxlen
+
+    @maxlen.setter
+    def maxlen(self, value: int) -> None:
+        if not isinstance(value, int) or value < 0:
+            raise ValueError("maxlen debe ser un entero no negativo")
+        with self._lock:
+            self._maxlen = value
+            self._entries = deque(maxlen=value)
+            self._warm = False
+
+    def push(self, entry: RecentAttendance) -> None:
+        with self._lock:
+            if self._maxlen:
+                self._entries.appendleft(entry)
+
+    def snapshot(self, limit: int) -> list[RecentAttendance] | None:
+        """
+        Las `limit` asistencias más recientes, o None si el buffer aún no se precargó o
+        venció su `ttl` y hay que releer la base de datos.
+        """
+        with self._lock:
+            if not self._fresh() or limit > self._maxlen:
+                return None
+            return list(self._entries)[:limit]
+
+    def warm(self, entries: list[RecentAttendance]) -> None:
+        """Precarga (o recarga) con asistencias ordenadas de la más reciente a la más antigua."""
+        with self._lock:
+            if not self._maxlen or self._fresh():
+                return
+            # Conservar lo registrado en este proceso que la base aún no tiene (escritura
+            # diferida); una asistencia por usuario y día, la de la base tiene prioridad
+            stored = {(e.user_id, e.date) for e in entries}
+            local = [e for e in self._entries if (e.user_id, e.date) not in stored]
+            merged = sorted(
+                local + list(entries),
+                key=lambda e: e.timestamp or datetime.min,
+                reverse=True,
+            )
+            self._entries = deque(merged[: self._maxlen], maxlen=self._maxlen)
+            self._warm = True
+            self._warmed_at = time.monotonic()
+
+    def _fresh(self) -> bool:
+        if not self._warm:
+            return False
+        return not self.ttl or time.monotonic() - self._warmed_at < self.ttl
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._warm = False
+
+
+# Buffer compartido por el proceso
+recent_attendance = RecentAttendanceBuffer()
@@ -0,0 +1,145 @@
+import hashlib
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from flask import current_app
+
+
+class MemoryReplayBackend:
+    """
+    Backend en proceso: claves con expiración en un dict protegido por lock.
+    - max_entries: cota de claves; al superarla se descartan las vencidas y luego las más antiguas.
+    """
+
+    def __init__(self, max_entries: int = 100_000) -> None:
+        self._entries: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+
+    def add(self, key: str, ttl: int) -> bool:
+        """Guarda la clave si no existe (como SET NX). Retorna True si se agregó."""
+        now = time.time()
+        with self._lock:
+            expires_at = self._entries.get(key)
+            if expires_at is not None and expires_at > now:
+                return False
+            self._entries[key] = now + ttl
+            if len(self._entries) > self._max_entries:
+                self._trim(now)
+            return True
+
+    def exists(self, key: str) -> bool:
+        now = time.time()
+        with self._lock:
+            expires_at = self._entries.get(key)
+            if expires_at is None:
+                return False
+            if expires_at <= now:
+                del self._entries[key]
+                return False
+            return True
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _trim(self, now: float) -> None:
+        for key in [k for k, exp in self._entries.items() if exp <= now]:
+            del self._entries[key]
+        while len(self._entries) > self._max_entries:
+            del self._entries[next(iter(self._entries))]
+
+
+class RedisReplayBackend:
+    """
+    Backend compartido entre workers sobre cualquier cliente con la API de redis-py
+    (`set(key, value, nx=, ex=)`, `exists`, `delete`), p. ej. `redis.Redis` o un fake local.
+    """
+
+    def __init__(self, client, prefix: str = "qr:replay:") -> None:
+        self._client = client
+        self._prefix = prefix
+
+    def add(self, key: str, ttl: int) -> bool:
+        return bool(self._client.set(self._prefix + key, 1, nx=True, ex=ttl))
+
+    def exists(self, key: str) -> bool:
+        return bool(self._client.exists(self._prefix + key))
+
+    def delete(self, key: str) -> None:
+        self._client.delete(self._prefix + key)
+
+
+class ReplayCache:
+    """
+    Caché de escaneos ya aceptados, consultada antes de tocar la base de datos:
+    - tokens QR ya usados (se guarda su hash, hasta que el token deja de ser válido).
+    - pares (user_id, fecha) con asistencia registrada (hasta el fin de ese día).
+
+    Solo atajos para duplicados: la restricción `unique_daily_attendance` sigue siendo
+    la fuente de verdad.
+    """
+
+    def __init__(self, backend) -> None:
+        self._backend = backend
+
+    def seen_token(self, token: str) -> bool:
+        return self._backend.exists(self._token_key(token))
+
+    def seen_attendance(self, user_id: int, date_obj: date) -> bool:
+        return self._backend.exists(self._attendance_key(user_id, date_obj))
+
+    def remember(
+        self, token: str | None, user_id: int, date_obj: date, token_ttl: int
+    ) -> None:
+        """Registra un escaneo aceptado (o ya presente en la base de datos)."""
+        if token:
+            self._backend.add(self._token_key(token), token_ttl)
+        self._backend.add(
+            self._attendance_key(user_id, date_obj), self._ttl_until_end_of(date_obj)
+        )
+
+    def forget_attendance(self, user_id: int, date_obj: date) -> None:
+        self._backend.delete(self._attendance_key(user_id, date_obj))
+
+    @staticmethod
+    def _token_key(token: str) -> str:
+        return "t:" + hashlib.sha256(token.encode()).hexdigest()
+
+    @staticmethod
+    def _attendance_key(user_id: int, date_obj: date) -> str:
+        return f"a:{user_id}:{date_obj.isoformat()}"
+
+    @staticmethod
+    def _ttl_until_end_of(date_obj: date) -> int:
+        end_of_day = datetime.combine(date_obj + timedelta(days=1), datetime.min.time())
+        return max(1, int((end_of_day - datetime.now()).total_seconds()))
+
+
+def create_replay_backend(url: str):
+    """
+    Crea el backend según la URL:
+    - '' o 'memory://': en proceso.
+    - 'redis://...' / 'rediss://...': Redis (requiere el paquete opcional `redis`).
+    """
+    if not url or url.startswith("memory://"):
+        return MemoryReplayBackend()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError(
+                "REPLAY_CACHE_URL usa Redis pero el paquete 'redis' no está instalado"
+            ) from e
+        return RedisReplayBackend(redis.Redis.from_url(url))
+    raise ValueError(f"REPLAY_CACHE_URL no soportada: {url}")
+
+
+def get_replay_cache() -> ReplayCache:
+    """Retorna la caché de escaneos de la aplicación actual, creándola la primera vez."""
+    cache = current_app.extensions.get("replay_cache")
+    if cache is None:
+        backend = create_replay_backend(current_app.config.get("REPLAY_CACHE_URL", ""))
+        cache = current_app.extensions.setdefault("replay_cache", ReplayCache(backend))
+    return cache
@@ -0,0 +1,100 @@
+from sqlalchemy import Index, inspect, text
+from sqlalchemy.schema import CreateIndex
+
+from app import db
+
+
+def upgrade_indexes(engine=None) -> list[str]:
+    """
+    Migración de índices para bases existentes: `create_all` solo crea los índices junto
+    con su tabla, así que acá se crean los declarados en los modelos que falten y se
+    reconstruyen los inválidos. En PostgreSQL se crean con CREATE INDEX CONCURRENTLY
+    para no bloquear escrituras. Es idempotente; retorna las operaciones realizadas.
+    No se ejecuta al iniciar la aplicación: en tablas grandes puede tardar minutos
+    (`flask upgrade-indexes`).
+    """
+    engine = engine or db.engine
+    done = []
+    for index, invalid in pending_indexes(engine):
+        if invalid:
+            # Un CREATE INDEX CONCURRENTLY interrumpido deja el índice INVALID: no se
+            # usa en las consultas pero se sigue actualizando en cada escritura
+            _drop_index(engine, index)
+        _create_index(engine, index)
+        done.append(f"{'~' if invalid else '+'} {index.name}")
+    return done
+
+
+def pending_indexes(engine=None) -> list[tuple[Index, bool]]:
+    """
+    Índices de los modelos que faltan en la base o quedaron inválidos (solo PostgreSQL).
+    Retorna (índice, inválido) sin modificar nada.
+    """
+    engine = engine or db.engine
+    inspector = inspect(engine)
+    pending = []
+
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        invalid = _invalid_indexes(engine, table.name)
+
+        for index in sorted(table.indexes, key=lambda ix: ix.name):
+            if index.name in invalid:
+                pending.append((index, True))
+            elif index.name not in existing:
+                pending.append((index, False))
+
+    return pending
+
+
+def _invalid_indexes(engine, table_name: str) -> set[str]:
+    if engine.dialect.name != "postgresql":
+        return set()
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text(
+                "SELECT ic.relname FROM pg_index i "
+                "JOIN pg_class ic ON ic.oid = i.indexrelid "
+                "JOIN pg_class tc ON tc.oid = i.indrelid "
+                "WHERE tc.relname = :table AND pg_table_is_visible(tc.oid) "
+                "AND NOT i.indisvalid"
+            ),
+            {"table": table_name},
+        )
+        return {name for (name,) in rows}
+
+
+def _create_index(engine, index) -> None:
+    from app.utils.partitioning import is_partitioned
+
+    # CONCURRENTLY no está soportado en tablas particionadas
+    if engine.dialect.name != "postgresql" or is_partitioned(engine, index.table.name):
+        with engine.begin() as conn:
+            conn.execute(CreateIndex(index, if_not_exists=True))
+        return
+
+    # CONCURRENTLY no puede ejecutarse dentro de una transacción
+    options = index.dialect_options["postgresql"]
+    previous = options["concurrently"]
+    options["concurrently"] = True
+    try:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(CreateIndex(index, if_not_exists=True))
+    finally:
+        options["concurrently"] = previous
+
+
+def _drop_index(engine, index) -> None:
+    from app.utils.partitioning import is_partitioned
+
+    quoted = engine.dialect.identifier_preparer.quote(index.name)
+    if engine.dialect.name == "postgresql" and not is_partitioned(
+        engine, index.table.name
+    ):
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {quoted}"))
+    else:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP INDEX IF EXISTS {quoted}"))
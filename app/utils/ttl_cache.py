@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Generic, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    """
+    Caché LRU acotada y thread-safe en la que cada entrada vence tras un tiempo.
+    - maxsize: número máximo de entradas en memoria (0 desactiva la caché).
+    - ttl: segundos que vive cada entrada si `set` no indica otro.
+    Cada invalidación incrementa `generation`: `set` descarta un valor leído antes de
+    una invalidación, así una lectura concurrente con una escritura no deja un valor
+    viejo.
+    Las subclases agregan la invalidación propia de lo que guardan (`_discard`).
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 30.0) -> None:
+        self._entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._maxsize: int = 0
+        self._generation = 0
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        self.maxsize = maxsize
+
+    @property
+    def maxsize(self) -> int:
+        return self._maxsize
+
+    @maxsize.setter
+    def maxsize(self, value: int) -> None:
+        if not isinstance(value, int) or value < 0:
+            raise ValueError("maxsize debe ser un entero no negativo")
+        with self._lock:
+            self._maxsize = value
+            self._evict_overflow()
+
+    @property
+    def generation(self) -> int:
+        """Valor a pasar a `set` para descartar un valor leído durante una escritura."""
+        return self._generation
+
+    def get(self, key: K) -> V | None:
+        """Retorna el valor cacheado o None si no existe o venció."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(
+        self,
+        key: K,
+        value: V,
+        generation: int | None = None,
+        ttl: float | None = None,
+    ) -> None:
+        """
+        Guarda el valor durante `ttl` segundos (por defecto `self.ttl`).
+        Con `generation`, solo si no hubo invalidaciones desde que se leyó.
+        """
+        if not self._maxsize:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            self._purge_expired()
+            self._evict_overflow()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Contadores de uso de la caché."""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self._maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def _discard(self, stale: Callable[[K], bool]) -> None:
+        """Invalida las entradas cuya clave cumple `stale`."""
+        with self._lock:
+            self._generation += 1
+            for key in [key for key in self._entries if stale(key)]:
+                del self._entries[key]
+
+    def _purge_expired(self) -> None:
+        # Las entradas menos usadas están al inicio: descartar las ya vencidas
+        now = time.monotonic()
+        while self._entries:
+            key, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            del self._entries[key]
+            self.expirations += 1
+
+    def _evict_overflow(self) -> None:
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
@@ -19,6 +19,85 @@ class Config:
         SQLALCHEMY_DATABASE_URI = _RAW_DATABASE_URL
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     QR_EXPIRATION = int(os.environ.get("QR_EXPIRATION", 60))  # segundos
+    # Máximo de tokens aceptados por POST /admin/attendance/batch
+    ATTENDANCE_BATCH_MAX_SIZE = int(os.environ.get("ATTENDANCE_BATCH_MAX_SIZE", 500))
+    # Escritura diferida de asistencias: confirmar el escaneo y persistir en lotes en segundo plano
+    ATTENDANCE_WRITE_BEHIND = os.environ.get(
+        "ATTENDANCE_WRITE_BEHIND", "false"
+    ).lower() in ("1", "true", "yes")
+    ATTENDANCE_WRITE_BEHIND_QUEUE_SIZE = int(
+        os.environ.get("ATTENDANCE_WRITE_BEHIND_QUEUE_SIZE", 10000)
+    )
+    ATTENDANCE_WRITE_BEHIND_BATCH_SIZE = int(
+        os.environ.get("ATTENDANCE_WRITE_BEHIND_BATCH_SIZE", 200)
+    )
+    ATTENDANCE_WRITE_BEHIND_FLUSH_INTERVAL = float(
+        os.environ.get("ATTENDANCE_WRITE_BEHIND_FLUSH_INTERVAL", 1.0)
+    )  # segundos
+    # Asistencias recientes guardadas en memoria para el escáner (0 consulta siempre la BD)
+    RECENT_ATTENDANCE_BUFFER_SIZE = int(
+        os.environ.get("RECENT_ATTENDANCE_BUFFER_SIZE", 0)
+    )
+    RECENT_ATTENDANCE_BUFFER_TTL = int(
+        os.environ.get("RECENT_ATTENDANCE_BUFFER_TTL", 30)
+    )  # segundos
+    # Feed en vivo de asistencias (SSE) en el escáner y la lista; cada conexión ocupa un worker
+    ATTENDANCE_LIVE_FEED = os.environ.get("ATTENDANCE_LIVE_FEED", "false").lower() in (
+        "1",
+        "true",
+        "yes",
+    )
+    # Feed en vivo: conexiones simultáneas por proceso y duración de cada una
+    SSE_MAX_SUBSCRIBERS = int(os.environ.get("SSE_MAX_SUBSCRIBERS", 100))
+    SSE_STREAM_TIMEOUT = int(os.environ.get("SSE_STREAM_TIMEOUT", 300))  # segundos
+    SSE_HEARTBEAT_INTERVAL = int(os.environ.get("SSE_HEARTBEAT_INTERVAL", 15))  # segundos
+    # Caché de escaneos duplicados: 'memory://' (por proceso) o 'redis://host:6379/0'
+    REPLAY_CACHE_URL = os.environ.get("REPLAY_CACHE_URL", "memory://")
+    # Formato de los tokens nuevos: 'text' o 'compact' (base32, QR versión 1); se validan ambos
+    QR_TOKEN_FORMAT = os.environ.get("QR_TOKEN_FORMAT", "text")
+    # Dónde se dibuja el QR del dashboard: 'server' (imagen inline) o 'client' (solo token)
+    QR_RENDER_MODE = os.environ.get("QR_RENDER_MODE", "server")
+    # Backend de imagen QR: 'pil' (Pillow), 'png' o 'svg' (versión/máscara fijas, sin Pillow)
+    QR_RENDERER = os.environ.get("QR_RENDERER", "pil")
+    # Máximo de imágenes QR renderizadas en memoria (0 desactiva la caché)
+    QR_IMAGE_CACHE_SIZE = int(os.environ.get("QR_IMAGE_CACHE_SIZE", 1024))
+    # Tokens alineados a ventanas de QR_EXPIRATION: mismo token (e imagen) por usuario y
+    # ventana. Por defecto activado si hay caché de imágenes: con un token por segundo
+    # ninguna imagen se reutiliza
+    QR_TOKEN_WINDOWED = os.environ.get(
+        "QR_TOKEN_WINDOWED", "true" if QR_IMAGE_CACHE_SIZE else "false"
+    ).lower() in ("1", "true", "yes")
+    # Totales de los listados paginados guardados en memoria (0 desactiva la caché)
+    ATTENDANCE_COUNT_CACHE_SIZE = int(
+        os.environ.get("ATTENDANCE_COUNT_CACHE_SIZE", 256)
+    )
+    ATTENDANCE_COUNT_CACHE_TTL = int(
+        os.environ.get("ATTENDANCE_COUNT_CACHE_TTL", 30)
+    )  # segundos
+    # Total del listado de administración desde el resumen diario en vez de contar filas
+    ATTENDANCE_APPROXIMATE_COUNTS = os.environ.get(
+        "ATTENDANCE_APPROXIMATE_COUNTS", "false"
+    ).lower() in ("1", "true", "yes")
+    # Identidad de la sesión (usuario y rol) cacheada entre peticiones (0 la desactiva)
+    IDENTITY_CACHE_SIZE = int(os.environ.get("IDENTITY_CACHE_SIZE", 1024))
+    IDENTITY_CACHE_TTL = int(os.environ.get("IDENTITY_CACHE_TTL", 30))  # segundos
+    # Particionar attendances por mes (solo PostgreSQL) y particiones creadas por adelantado
+    ATTENDANCE_PARTITIONING = os.environ.get(
+        "ATTENDANCE_PARTITIONING", "false"
+    ).lower() in ("1", "true", "yes")
+    ATTENDANCE_PARTITION_MONTHS_AHEAD = int(
+        os.environ.get("ATTENDANCE_PARTITION_MONTHS_AHEAD", 3)
+    )
+    # Archivo de meses antiguos (CSV gzip) y meses que se mantienen en la base de datos
+    ATTENDANCE_ARCHIVE_DIR = os.environ.get("ATTENDANCE_ARCHIVE_DIR", "")
+    ATTENDANCE_LIVE_MONTHS = int(os.environ.get("ATTENDANCE_LIVE_MONTHS", 24))
+
+    # Contar las consultas SQL de cada petición y enviarlas en la cabecera X-Query-Count
+    SQL_QUERY_COUNTER = os.environ.get("SQL_QUERY_COUNTER", "false").lower() in (
+        "1",
+        "true",
+        "yes",
+    )
 
 
 class DevelopmentConfig(Config):
@@ -0,0 +1,49 @@
+import os
+import tempfile
+import time
+import unittest
+from datetime import date
+
+_tmp = tempfile.mkdtemp()
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("QR_SECRET_KEY", "test")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_tmp, 'test.db')}")
+
+from app import create_app, db  # noqa: E402
+from app.models.attendance import Attendance  # noqa: E402
+from app.models.attendance_daily_stats import AttendanceDailyStats  # noqa: E402
+from app.services.attendance_writer import AttendanceWriteBehind  # noqa: E402
+from app.services.user_service import UserService  # noqa: E402
+
+
+class AttendanceWriteBehindTest(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("development")
+        with self.app.app_context():
+            self.user_id = UserService().create(f"u{time.time_ns()}", "pw", "User").id
+        self.writer = AttendanceWriteBehind(self.app, flush_interval=1.0)
+
+    def tearDown(self):
+        self.writer.stop()
+        with self.app.app_context():
+            Attendance.query.delete()
+            AttendanceDailyStats.query.delete()
+            db.session.commit()
+
+    def test_delayed_flush_keeps_submit_timestamp(self):
+        today = date.today()
+        submitted_at = self.writer.submit(self.user_id, today)
+        # El lote se escribe al menos un flush_interval después del escaneo
+        time.sleep(1.2)
+        self.assertTrue(self.writer.flush(timeout=5))
+
+        with self.app.app_context():
+            attendance = Attendance.query.filter_by(user_id=self.user_id).one()
+            self.assertEqual(attendance.timestamp, submitted_at)
+            stats = db.session.get(AttendanceDailyStats, today)
+            self.assertEqual(stats.first_timestamp, submitted_at)
+            self.assertEqual(stats.last_timestamp, submitted_at)
+
+
+if __name__ == "__main__":
+    unittest.main()